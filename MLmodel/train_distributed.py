@@ -0,0 +1,120 @@
+"""
+Multi-process CPU (or GPU) fine-tuning with torch.distributed
+
+Launch one process per worker with torchrun; the gloo backend is used on CPU.
+The dataset is sharded across processes by the Trainer's distributed sampler,
+and the global batch is kept constant across world sizes (via gradient
+accumulation) so checkpoints can be resumed with a different process count.
+
+Single machine, 4 processes:
+    torchrun --nproc_per_node 4 train_distributed.py --output-dir ./models/flan_t5_meeting_minutes
+
+Two machines, 8 processes each (run on every node with its --node_rank):
+    torchrun --nnodes 2 --node_rank 0 --nproc_per_node 8 --master_addr 10.0.0.1 --master_port 29500 \
+        train_distributed.py --output-dir /shared/flan_t5_meeting_minutes
+
+Resume (any world size):
+    torchrun --nproc_per_node 8 train_distributed.py --output-dir ... --resume
+
+Scaling report (samples/sec vs process count):
+    python train_distributed.py --scaling-report ./models/flan_t5_meeting_minutes/scaling_report.jsonl
+"""
+
+import argparse
+import logging
+import os
+
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers.trainer_utils import get_last_checkpoint
+
+from utils.dataset import load_ami_dataset, preprocess_data
+from utils.training import (
+    ThroughputCallback,
+    configure_cpu_threads,
+    create_trainer,
+    create_training_arguments,
+    format_scaling_report,
+    get_distributed_info,
+    gradient_accumulation_for,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Distributed FLAN-T5 fine-tuning on meeting transcripts')
+    parser.add_argument('--model-name', default='google/flan-t5-base')
+    parser.add_argument('--output-dir', default='./models/flan_t5_meeting_minutes')
+    parser.add_argument('--epochs', type=float, default=5)
+    parser.add_argument('--learning-rate', type=float, default=2e-4)
+    parser.add_argument('--batch-size', type=int, default=4, help='Per-process micro-batch size')
+    parser.add_argument('--global-batch-size', type=int, default=32,
+                        help='Samples per optimizer step across all processes (kept constant)')
+    parser.add_argument('--max-steps', type=int, default=-1, help='Stop after N optimizer steps (for scaling runs)')
+    parser.add_argument('--sample-size', type=int, default=None, help='Limit training samples (for testing)')
+    parser.add_argument('--num-workers', type=int, default=0, help='Dataloader workers per process')
+    parser.add_argument('--resume', action='store_true', help='Resume from the latest checkpoint in --output-dir')
+    parser.add_argument('--scaling-report', metavar='PATH', help='Print a scaling report and exit')
+    return parser
+
+
+def main(args):
+    dist = get_distributed_info()
+    configure_cpu_threads()
+
+    grad_accum = gradient_accumulation_for(args.global_batch_size, args.batch_size, dist['world_size'])
+    logger.info(f'Rank {dist["rank"]}/{dist["world_size"]}: micro-batch {args.batch_size}, '
+                f'gradient accumulation {grad_accum}, global batch {args.batch_size * grad_accum * dist["world_size"]}')
+
+    training_args = create_training_arguments(
+        output_dir=args.output_dir,
+        num_train_epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        batch_size=args.batch_size,
+        gradient_accumulation_steps=grad_accum,
+        num_workers=args.num_workers,
+        logging_dir=os.path.join(args.output_dir, 'logs'),
+        warmup_steps=200,
+        max_steps=args.max_steps,
+    )
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(args.model_name)
+
+    # Rank 0 downloads and tokenizes first; the others reuse the datasets cache
+    with training_args.main_process_first(desc='dataset preprocessing'):
+        train_dataset = load_ami_dataset('train', args.sample_size)
+        eval_dataset = load_ami_dataset('validation', args.sample_size)
+        columns = train_dataset.column_names
+        train_dataset = train_dataset.map(preprocess_data, batched=True, remove_columns=columns,
+                                          fn_kwargs={'tokenizer': tokenizer})
+        eval_dataset = eval_dataset.map(preprocess_data, batched=True, remove_columns=columns,
+                                        fn_kwargs={'tokenizer': tokenizer})
+
+    trainer = create_trainer(model, tokenizer, train_dataset, eval_dataset, training_args)
+    trainer.add_callback(ThroughputCallback(
+        os.path.join(args.output_dir, 'scaling_report.jsonl'),
+        global_batch_size=args.batch_size * grad_accum * dist['world_size'],
+        extra={'nodes': dist['world_size'] // dist['local_world_size']},
+    ))
+
+    checkpoint = None
+    if args.resume and os.path.isdir(args.output_dir):
+        checkpoint = get_last_checkpoint(args.output_dir)
+        logger.info(f'Resuming from {checkpoint}' if checkpoint else 'No checkpoint found, starting fresh')
+
+    trainer.train(resume_from_checkpoint=checkpoint)
+
+    if trainer.is_world_process_zero():
+        trainer.save_model(args.output_dir)
+        tokenizer.save_pretrained(args.output_dir)
+        logger.info(f'Model saved to {args.output_dir}')
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    if args.scaling_report:
+        print(format_scaling_report(args.scaling_report))
+    else:
+        main(args)
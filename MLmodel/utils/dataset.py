@@ -37,6 +37,33 @@ def load_samsum_dataset(split='train', sample_size=None):
         raise
 
 
+def load_ami_dataset(split='train', sample_size=None):
+    """
+    Load the AMI meeting corpus (dialogue/summary pairs, as used by train.py)
+    
+    Args:
+        split: 'train', 'validation', or 'test'
+        sample_size: Optional, number of samples to load (for testing)
+        
+    Returns:
+        Dataset object
+    """
+    logger.info(f'Loading AMI dataset ({split} split)')
+    
+    try:
+        dataset = load_dataset('knkarthick/AMI', split=split)
+        
+        if sample_size:
+            dataset = dataset.select(range(min(sample_size, len(dataset))))
+        logger.info(f'Loaded {len(dataset)} samples')
+        
+        return dataset
+        
+    except Exception as e:
+        logger.error(f'Failed to load dataset: {str(e)}')
+        raise
+
+
 def preprocess_data(examples, tokenizer, max_input_length=512, max_target_length=150):
     """
     Preprocess dataset examples
@@ -2,9 +2,12 @@
 Training utilities and callbacks
 """
 
+import json
 import logging
+import os
+import time
 from transformers import Seq2SeqTrainingArguments, Seq2SeqTrainer, DataCollatorForSeq2Seq
-from transformers import T5ForConditionalGeneration, T5Tokenizer
+from transformers import T5ForConditionalGeneration, T5Tokenizer, TrainerCallback
 import torch
 
 logger = logging.getLogger(__name__)
@@ -18,16 +21,20 @@ def create_training_arguments(output_dir, num_train_epochs, learning_rate, batch
         output_dir: Output directory for checkpoints
         num_train_epochs: Number of training epochs
         learning_rate: Learning rate
-        batch_size: Training batch size
+        batch_size: Training batch size (per process)
         **kwargs: Additional arguments
         
     Returns:
         Seq2SeqTrainingArguments object
     """
+    use_cuda = torch.cuda.is_available() and not kwargs.get('use_cpu', False)
+    distributed = get_distributed_info()['world_size'] > 1
+    
     return Seq2SeqTrainingArguments(
         output_dir=output_dir,
         overwrite_output_dir=True,
         num_train_epochs=num_train_epochs,
+        max_steps=kwargs.get('max_steps', -1),
         learning_rate=learning_rate,
         per_device_train_batch_size=batch_size,
         per_device_eval_batch_size=batch_size,
@@ -43,7 +50,10 @@ def create_training_arguments(output_dir, num_train_epochs, learning_rate, batch
         load_best_model_at_end=True,
         metric_for_best_model='eval_loss',
         greater_is_better=False,
-        fp16=kwargs.get('fp16', False),
+        fp16=kwargs.get('fp16', False) and use_cuda,  # fp16 needs a GPU
+        use_cpu=not use_cuda,
+        ddp_backend=kwargs.get('ddp_backend', ('nccl' if use_cuda else 'gloo') if distributed else None),
+        ddp_find_unused_parameters=False if distributed else None,
         dataloader_num_workers=kwargs.get('num_workers', 4),
         seed=kwargs.get('seed', 42),
         report_to=['tensorboard'],
@@ -79,6 +89,146 @@ def create_trainer(model, tokenizer, train_dataset, eval_dataset, training_args,
     return trainer
 
 
+def get_distributed_info():
+    """
+    Read the process layout set by torchrun (single process if unset)
+    
+    Returns:
+        Dict with rank, local_rank, world_size and local_world_size
+    """
+    return {
+        'rank': int(os.environ.get('RANK', 0)),
+        'local_rank': int(os.environ.get('LOCAL_RANK', -1)),
+        'world_size': int(os.environ.get('WORLD_SIZE', 1)),
+        'local_world_size': int(os.environ.get('LOCAL_WORLD_SIZE', 1)),
+    }
+
+
+def gradient_accumulation_for(global_batch_size, batch_size, world_size):
+    """
+    Accumulation steps that keep the global batch constant across world sizes
+    
+    A constant global batch means a checkpoint's global_step covers the same
+    number of samples whatever the process count, so runs can resume with a
+    different number of processes.
+    
+    Args:
+        global_batch_size: Samples per optimizer step across all processes
+        batch_size: Per-process micro-batch size
+        world_size: Number of processes
+        
+    Returns:
+        Gradient accumulation steps (at least 1)
+    """
+    per_step = batch_size * world_size
+    if global_batch_size % per_step:
+        logger.warning(f'Global batch {global_batch_size} is not divisible by {batch_size} x {world_size} '
+                       f'processes; rounding up')
+    return max(1, -(-global_batch_size // per_step))
+
+
+def configure_cpu_threads():
+    """Split the machine's cores between the processes started on this node"""
+    local_world_size = get_distributed_info()['local_world_size']
+    threads = max(1, (os.cpu_count() or 1) // local_world_size)
+    torch.set_num_threads(threads)
+    logger.info(f'Using {threads} intra-op threads per process ({local_world_size} processes on this node)')
+    return threads
+
+
+class ThroughputCallback(TrainerCallback):
+    """
+    Measures training throughput and appends it to a JSONL scaling report
+    (rank 0 only), so runs at different process counts can be compared
+    
+    Evaluation and checkpoint time is recorded separately and excluded from
+    samples/sec: it runs between optimizer steps, so it is attributed from the
+    end of the previous step until ``on_evaluate``/``on_save`` fires.
+    """
+    
+    def __init__(self, report_path, global_batch_size, extra=None):
+        self.report_path = report_path
+        self.global_batch_size = global_batch_size
+        self.extra = extra or {}
+        self._start = None
+        self._start_step = 0
+        self._mark = None
+        self._seconds = {'train': 0.0, 'eval': 0.0, 'save': 0.0}
+    
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._start = self._mark = time.perf_counter()
+        self._start_step = state.global_step
+        self._seconds = {'train': 0.0, 'eval': 0.0, 'save': 0.0}
+    
+    def _lap(self, phase):
+        if self._mark is None:
+            return
+        now = time.perf_counter()
+        self._seconds[phase] += now - self._mark
+        self._mark = now
+    
+    def on_step_end(self, args, state, control, **kwargs):
+        self._lap('train')
+    
+    def on_evaluate(self, args, state, control, **kwargs):
+        self._lap('eval')
+    
+    def on_save(self, args, state, control, **kwargs):
+        self._lap('save')
+    
+    def on_train_end(self, args, state, control, **kwargs):
+        if not state.is_world_process_zero or self._start is None:
+            return
+        seconds = self._seconds['train']
+        steps = state.global_step - self._start_step
+        samples = steps * self.global_batch_size
+        record = {
+            'world_size': args.world_size,
+            'per_device_batch_size': args.per_device_train_batch_size,
+            'gradient_accumulation_steps': args.gradient_accumulation_steps,
+            'global_batch_size': self.global_batch_size,
+            'steps': steps,
+            'seconds': round(seconds, 2),
+            'eval_seconds': round(self._seconds['eval'], 2),
+            'save_seconds': round(self._seconds['save'], 2),
+            'wall_seconds': round(time.perf_counter() - self._start, 2),
+            'samples_per_sec': round(samples / seconds, 3) if seconds else 0.0,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            **self.extra,
+        }
+        with open(self.report_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        logger.info(f'Throughput: {record["samples_per_sec"]} samples/sec with {args.world_size} processes '
+                    f'({record["eval_seconds"]}s eval and {record["save_seconds"]}s checkpointing excluded)')
+
+
+def format_scaling_report(report_path):
+    """
+    Summarize a scaling report as samples/sec vs process count
+    
+    Returns:
+        Text table with speedup and efficiency relative to the smallest run
+    """
+    with open(report_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        return 'No runs recorded'
+    
+    # Latest run per world size
+    latest = {}
+    for record in records:
+        latest[record['world_size']] = record
+    runs = [latest[size] for size in sorted(latest)]
+    base = runs[0]
+    
+    lines = [f'{"processes":>9}  {"samples/sec":>11}  {"speedup":>7}  {"efficiency":>10}']
+    for run in runs:
+        speedup = run['samples_per_sec'] / base['samples_per_sec'] if base['samples_per_sec'] else 0.0
+        efficiency = speedup * base['world_size'] / run['world_size']
+        lines.append(f'{run["world_size"]:>9}  {run["samples_per_sec"]:>11.2f}  {speedup:>6.2f}x  {efficiency:>9.0%}')
+    return '\n'.join(lines)
+
+
 def get_device():
     """Get the device (GPU or CPU)"""
     if torch.cuda.is_available():
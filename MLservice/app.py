@@ -3,15 +3,21 @@ MLservice - Inference server for meeting transcript summarization
 Loads the fine-tuned T5 model and provides summarization endpoints
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
+import hmac
 import logging
 import os
 from dotenv import load_dotenv
 import torch
 
-from utils.model import load_model
+from utils.batch import length_sorted_batches, ndjson_line, parse_batch_body
 from utils.formatter import format_minutes
+from utils.model import load_model
+from utils.optimize import configure_compile, configure_threads, parse_buckets
+from utils.profiling import ARTIFACTS, ProfileStore, RequestProfiler, instrument_model
+from utils.registry import ModelRegistry, UnknownModelError, parse_registry_spec
+from utils.validation import apply_token_budget
 
 load_dotenv()
 
@@ -21,38 +27,195 @@ CORS(app)
 # Configuration
 MODEL_PATH = os.getenv('MODEL_PATH', os.path.join(os.path.dirname(__file__), '../MLmodel/models/flan_t5_meeting_minutes'))
 MODEL_PATH = str(MODEL_PATH)  # Ensure it's a string
-MAX_INPUT_LENGTH = int(os.getenv('MAX_INPUT_LENGTH', '1500'))  # words (reduced from 4000 to avoid truncation)
+MODEL_WINDOW_TOKENS = int(os.getenv('MODEL_WINDOW_TOKENS', '512'))  # model input window; longer inputs are chunked
+MAX_INPUT_TOKENS = int(os.getenv('MAX_INPUT_TOKENS', '4096'))  # tokens summarized across chunks; the rest is truncated
+LONG_INPUT_STRATEGY = os.getenv('LONG_INPUT_STRATEGY', 'salience')  # over-window inputs: 'salience' or 'chunked'
+# Cheap guard applied before tokenizing; salience selection handles 10k-turn (~1.1M char) transcripts
+MAX_INPUT_CHARS = int(os.getenv('MAX_INPUT_CHARS', '2000000' if LONG_INPUT_STRATEGY == 'salience' else '200000'))
+TOKEN_CACHE_TOKENS = int(os.getenv('TOKEN_CACHE_TOKENS', '1000000'))  # total cached tokens per model
+MODEL_REGISTRY = os.getenv('MODEL_REGISTRY', '')  # extra checkpoints: name=path,name2=path2
+DEFAULT_MODEL = os.getenv('DEFAULT_MODEL', 'finetuned')
+MODEL_MEMORY_BUDGET_MB = int(os.getenv('MODEL_MEMORY_BUDGET_MB', '0'))  # 0 = unlimited
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+TORCH_COMPILE = os.getenv('TORCH_COMPILE', '0') == '1'  # opt-in torch.compile execution path
+TORCH_COMPILE_MODE = os.getenv('TORCH_COMPILE_MODE') or None
+INPUT_BUCKETS = parse_buckets(os.getenv('INPUT_BUCKETS', '128,256,512' if TORCH_COMPILE else ''))
+STATIC_KV_CACHE = os.getenv('STATIC_KV_CACHE', '0') == '1'  # opt-in pooled static KV cache decoder
+KV_CACHE_POOL_MB = int(os.getenv('KV_CACHE_POOL_MB', '640'))  # idle KV cache memory per model; fits one BATCH_SIZE cache
+TORCH_NUM_THREADS = int(os.getenv('TORCH_NUM_THREADS', '0'))  # 0 = torch default
+TORCH_INTEROP_THREADS = int(os.getenv('TORCH_INTEROP_THREADS', '0'))
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '8'))  # model inputs (transcripts or chunks) per generate call
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '1000'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))  # fraction of requests profiled
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '1000'))  # sampled profiles kept only above this
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))  # profiles retained on disk
+PROFILE_MAX_BYTES = int(os.getenv('PROFILE_MAX_BYTES', str(500 * 1024 * 1024)))  # total profile size on disk; 0 = unlimited
+PROFILE_CHROME_TRACE = os.getenv('PROFILE_CHROME_TRACE', '0') == '1'  # also export the (large) full Chrome trace
+PROFILE_STACK_INTERVAL_MS = float(os.getenv('PROFILE_STACK_INTERVAL_MS', '5'))
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global model instance
-model = None
+configure_threads(TORCH_NUM_THREADS, TORCH_INTEROP_THREADS)
+if TORCH_COMPILE:
+    configure_compile()
+
+
+def _load_checkpoint(path):
+    model = load_model(model_name=path, use_finetuned=True, optimize=TORCH_COMPILE,
+                      buckets=INPUT_BUCKETS, compile_mode=TORCH_COMPILE_MODE,
+                      max_input_tokens=MODEL_WINDOW_TOKENS, token_cache_tokens=TOKEN_CACHE_TOKENS,
+                      static_cache=STATIC_KV_CACHE, kv_cache_pool_bytes=KV_CACHE_POOL_MB * 1024 * 1024,
+                      fallback_model=None)
+    # Label encoder/decoder calls so profiles separate them from beam search bookkeeping
+    instrument_model(model.model)
+    return model
+
+
+# Global model registry (checkpoints are loaded lazily on first use)
+registry = ModelRegistry(memory_budget_bytes=MODEL_MEMORY_BUDGET_MB * 1024 * 1024, loader=_load_checkpoint)
+registry.register('finetuned', MODEL_PATH)
+for _name, _path in parse_registry_spec(MODEL_REGISTRY):
+    registry.register(_name, _path)
+
+profiler = RequestProfiler(
+    ProfileStore(PROFILE_DIR, max_profiles=PROFILE_MAX_FILES, max_bytes=PROFILE_MAX_BYTES),
+    sample_rate=PROFILE_SAMPLE_RATE,
+    slow_ms=PROFILE_SLOW_MS,
+    stack_interval_ms=PROFILE_STACK_INTERVAL_MS,
+    chrome_trace=PROFILE_CHROME_TRACE,
+)
 
 
 def load_model_on_startup():
-    """Load model when the app starts"""
-    global model
+    """Load the default model when the app starts"""
     try:
-        logger.info(f'Loading fine-tuned AMI model from {MODEL_PATH}')
-        model = load_model(model_name=MODEL_PATH, use_finetuned=True)
+        logger.info(f'Loading default model {DEFAULT_MODEL}')
+        registry.set_default(DEFAULT_MODEL)
         logger.info('Model loaded successfully')
     except Exception as e:
         logger.error(f'Failed to load model: {str(e)}')
         raise
 
 
+def _validate_transcript(transcript):
+    """
+    Cheap checks before tokenizing; the token budget is applied by the model
+    
+    Returns:
+        (stripped transcript, error message or None)
+    """
+    if not isinstance(transcript, str):
+        return None, 'Missing transcript field'
+    
+    transcript = transcript.strip()
+    if not transcript:
+        return None, 'Transcript cannot be empty'
+    
+    if len(transcript) > MAX_INPUT_CHARS:
+        return None, f'Transcript too long. Maximum {MAX_INPUT_CHARS} characters. Got {len(transcript)}.'
+    
+    return transcript, None
+
+
+def _token_budget(model, transcript, encoded):
+    """Fit an encoded transcript to the model window using the configured strategy"""
+    selector = model.salience if LONG_INPUT_STRATEGY == 'salience' else None
+    return apply_token_budget(encoded, model.max_input_tokens, MAX_INPUT_TOKENS, selector=selector, text=transcript)
+
+
+def _is_admin():
+    """Admin endpoints require X-Admin-Token and are disabled while ADMIN_TOKEN is unset"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+
+def _forbidden():
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (ADMIN_TOKEN is not set)'}), 403
+    return jsonify({'error': 'Forbidden'}), 403
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'model': 'T5 AMI Fine-tuned',
+        'model': registry.default_name,
         'device': 'cuda' if torch.cuda.is_available() else 'cpu'
     })
 
 
+@app.route('/models', methods=['GET'])
+def list_models():
+    """List registered models and their load state"""
+    return jsonify(registry.describe())
+
+
+@app.route('/admin/models', methods=['POST'])
+def register_model():
+    """
+    Register an additional checkpoint (loaded lazily on first use)
+
+    Request JSON:
+    {
+        "name": "quantized",
+        "path": "/models/flan_t5_int8",
+        "preload": false
+    }
+    """
+    if not _is_admin():
+        return _forbidden()
+
+    data = request.get_json(silent=True) or {}
+    name, path = data.get('name'), data.get('path')
+    if not name or not path:
+        return jsonify({'error': 'Missing name or path field'}), 400
+
+    try:
+        registry.register(name, path)
+        if data.get('preload'):
+            registry.preload(name)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f'Failed to load model {name}: {str(e)}')
+        return jsonify({'error': f'Failed to load model {name}'}), 500
+
+    return jsonify(registry.describe()), 200
+
+
+@app.route('/admin/models/default', methods=['POST'])
+def swap_default_model():
+    """
+    Hot-swap the default model without downtime
+
+    Request JSON:
+    {
+        "name": "base"
+    }
+    """
+    if not _is_admin():
+        return _forbidden()
+
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({'error': 'Missing name field'}), 400
+
+    try:
+        previous = registry.set_default(name)
+    except UnknownModelError:
+        return jsonify({'error': f'Unknown model: {name}'}), 404
+    except Exception as e:
+        logger.error(f'Failed to swap default model to {name}: {str(e)}')
+        return jsonify({'error': f'Failed to load model {name}'}), 500
+
+    return jsonify({'previous': previous, 'default': name}), 200
+
+
 @app.route('/summarize', methods=['POST'])
 def summarize():
     """
@@ -60,7 +223,8 @@ def summarize():
     
     Request JSON:
     {
-        "transcript": "meeting transcript text..."
+        "transcript": "meeting transcript text...",
+        "model": "optional registered model name"
     }
     
     Response JSON:
@@ -69,40 +233,45 @@ def summarize():
     }
     """
     try:
-        if model is None:
-            return jsonify({'error': 'Model not loaded'}), 503
-        
         data = request.get_json()
         
         if not data or 'transcript' not in data:
             return jsonify({'error': 'Missing transcript field'}), 400
         
-        transcript = data['transcript'].strip()
+        transcript, error = _validate_transcript(data['transcript'])
+        if error:
+            return jsonify({'error': error}), 400
         
-        if not transcript:
-            return jsonify({'error': 'Transcript cannot be empty'}), 400
+        model_name = data.get('model')
+        if model_name and model_name not in registry.names():
+            return jsonify({'error': f'Unknown model: {model_name}'}), 400
         
-        # Check length
-        word_count = len(transcript.split())
-        if word_count > MAX_INPUT_LENGTH:
-            return jsonify({
-                'error': f'Transcript too long. Maximum {MAX_INPUT_LENGTH} words. Got {word_count}.'
-            }), 400
+        # Profile when forced via X-Profile: 1 (admin) or sampled
+        forced = request.headers.get('X-Profile') == '1' and _is_admin()
         
-        logger.info(f'Summarizing transcript ({word_count} words)')
-        
-        # Generate summary
-        summary = model.summarize(transcript)
-        logger.info(f'Generated summary: {len(summary.split())} words')
-        
-        # Format into minutes
-        minutes = format_minutes(summary, format_type='bullets')
+        # Generate summary (the borrowed model survives a concurrent hot-swap)
+        with registry.acquire(model_name) as (model_name, model), \
+                profiler.profile(forced=forced, model=model_name, chars=len(transcript)) as session:
+            # Tokenize once: the same ids drive validation and generation
+            with session.phase('tokenize'):
+                encoded, budget = _token_budget(model, transcript, model.encode(transcript))
+            logger.info(f'Summarizing transcript ({budget["input_tokens"]} tokens, '
+                        f'{budget["chunks"]} chunk(s)) with {model_name}')
+            with session.phase('summarize'):
+                summary = model.summarize(transcript, encoded=encoded)
+            logger.info(f'Generated summary: {len(summary.split())} words')
+            
+            # Format into minutes
+            with session.phase('format'):
+                minutes = format_minutes(summary, format_type='bullets')
         
         return jsonify({
             'minutes': minutes,
             'stats': {
-                'input_words': word_count,
-                'output_words': len(minutes.split())
+                'input_words': len(transcript.split()),
+                'output_words': len(minutes.split()),
+                'model': model_name,
+                **budget
             }
         }), 200
         
@@ -111,6 +280,140 @@ def summarize():
         return jsonify({'error': 'Failed to generate summary'}), 500
 
 
+@app.route('/summarize/batch', methods=['POST'])
+def summarize_batch():
+    """
+    Summarize many transcripts over a single connection
+    
+    Request body: JSON array or NDJSON, one item per transcript
+    [
+        {"id": "meeting-1", "transcript": "..."},
+        "plain transcript text..."
+    ]
+    Optional ?model=<registered name> selects the model for the whole batch.
+    
+    Response: NDJSON, one line per item as it completes (not in input order)
+    {"index": 0, "id": "meeting-1", "minutes": "...", "stats": {...}}
+    {"index": 1, "id": null, "error": "Transcript cannot be empty"}
+    {"done": true, "succeeded": 1, "failed": 1}
+    """
+    try:
+        items = parse_batch_body(request.get_data(), request.content_type or '')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'error': f'Too many transcripts. Maximum {MAX_BATCH_ITEMS}. Got {len(items)}.'}), 400
+    
+    model_name = request.args.get('model')
+    if model_name and model_name not in registry.names():
+        return jsonify({'error': f'Unknown model: {model_name}'}), 400
+    
+    # Validate every item independently; invalid ones are reported, not fatal
+    valid, rejected = [], []
+    for index, item in enumerate(items):
+        error = item.get('error')
+        transcript = None
+        if not error:
+            transcript, error = _validate_transcript(item['transcript'])
+        if error:
+            rejected.append({'index': index, 'id': item['id'], 'error': error})
+        else:
+            valid.append({'index': index, 'id': item['id'], 'transcript': transcript})
+    
+    logger.info(f'Batch request: {len(valid)} valid, {len(rejected)} rejected transcripts')
+    
+    def generate():
+        succeeded, failed = 0, len(rejected)
+        for result in rejected:
+            yield ndjson_line(result)
+        
+        # Items without a result line yet; all of them get an error if the batch aborts
+        pending = {item['index']: item for item in valid}
+        try:
+            if valid:
+                with registry.acquire(model_name) as (name, model):
+                    # One fast-tokenizer call for the whole request; ids are reused for generation
+                    encoded_items = model.encode_batch([item['transcript'] for item in valid])
+                    for item, encoded in zip(valid, encoded_items):
+                        item['encoded'], item['budget'] = _token_budget(model, item['transcript'], encoded)
+                    
+                    for batch in length_sorted_batches(valid, BATCH_SIZE, key=lambda item: item['encoded'].token_count,
+                                                       weight=lambda item: item['budget']['chunks']):
+                        try:
+                            summaries = model.summarize_batch(
+                                [item['transcript'] for item in batch],
+                                encoded=[item['encoded'] for item in batch]
+                            )
+                        except Exception as e:
+                            logger.error(f'Error during batch summarization: {str(e)}')
+                            for item in batch:
+                                del pending[item['index']]
+                                failed += 1
+                                yield ndjson_line({'index': item['index'], 'id': item['id'],
+                                                   'error': 'Failed to generate summary'})
+                            continue
+                        
+                        for item, summary in zip(batch, summaries):
+                            minutes = format_minutes(summary, format_type='bullets')
+                            del pending[item['index']]
+                            succeeded += 1
+                            yield ndjson_line({
+                                'index': item['index'],
+                                'id': item['id'],
+                                'minutes': minutes,
+                                'stats': {
+                                    'input_words': len(item['transcript'].split()),
+                                    'output_words': len(minutes.split()),
+                                    'model': name,
+                                    **item['budget']
+                                }
+                            })
+        except Exception as e:
+            logger.error(f'Batch summarization aborted: {str(e)}')
+            for item in pending.values():
+                failed += 1
+                yield ndjson_line({'index': item['index'], 'id': item['id'], 'error': 'Failed to generate summary'})
+        
+        yield ndjson_line({'done': True, 'succeeded': succeeded, 'failed': failed})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """
+    List the most recent stored profiles (newest first)
+    
+    Query params: limit (default 20), min_ms (only profiles at least this slow)
+    """
+    if not _is_admin():
+        return _forbidden()
+    
+    limit = request.args.get('limit', 20, type=int)
+    min_ms = request.args.get('min_ms', 0, type=float)
+    profiles = [meta for meta in profiler.store.list() if meta['duration_ms'] >= min_ms]
+    return jsonify({'profiles': profiles[:limit]})
+
+
+@app.route('/profiles/<profile_id>/<artifact>', methods=['GET'])
+def download_profile(profile_id, artifact):
+    """
+    Download one profile artifact
+    
+    Artifacts: meta.json, operators.txt (torch operator table),
+    trace.json (chrome://tracing, only with PROFILE_CHROME_TRACE=1),
+    stacks.folded (flame graph input)
+    """
+    if not _is_admin():
+        return _forbidden()
+    
+    meta = profiler.store.get(profile_id)
+    if artifact not in ARTIFACTS or meta is None or artifact not in meta.get('artifacts', ARTIFACTS):
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_from_directory(profiler.store.artifact_dir(profile_id), artifact, as_attachment=True)
+
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
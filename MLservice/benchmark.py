@@ -0,0 +1,308 @@
+"""
+Benchmark tooling for MLservice inference
+
+Latency mode measures model load time, startup cost of the optimized
+(torch.compile) execution path and steady-state summarization latency, eager
+vs optimized. Salience mode compares long-input strategies (plain truncation,
+chunking, extractive salience pre-selection) on ROUGE against AMI reference
+summaries and times turn selection on a synthetic 10k-turn transcript.
+Decoding mode compares model.generate with the pooled static KV cache
+decoder on peak RSS and per-step latency, each in a fresh process.
+
+Usage:
+    python benchmark.py --model ../MLmodel/models/flan_t5_meeting_minutes --runs 5
+    python benchmark.py --model t5-small --threads 4 --buckets 128,256,512 --json results.json
+    python benchmark.py --mode salience --limit 50 --json salience.json
+    python benchmark.py --mode decoding --concurrency 4 --runs 3
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.model import load_model
+from utils.optimize import configure_threads, parse_buckets
+from utils.validation import apply_token_budget
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_GLOB = os.path.join(os.path.dirname(__file__), '..', 'sample*.txt')
+
+
+def load_samples(pattern=SAMPLES_GLOB):
+    """Read sample transcripts shipped with the repo"""
+    samples = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding='utf-8') as f:
+            samples.append(f.read())
+    if not samples:
+        raise FileNotFoundError(f'No sample transcripts match {pattern}')
+    return samples
+
+
+def time_summaries(model, samples, runs):
+    """
+    Time ``runs`` passes over every sample
+
+    Returns:
+        Dict with mean/p50/max latency in seconds
+    """
+    latencies = []
+    for _ in range(runs):
+        for text in samples:
+            start = time.perf_counter()
+            model.summarize(text)
+            latencies.append(time.perf_counter() - start)
+    return {
+        'requests': len(latencies),
+        'mean_s': round(statistics.mean(latencies), 4),
+        'p50_s': round(statistics.median(latencies), 4),
+        'max_s': round(max(latencies), 4),
+    }
+
+
+def run_benchmark(args):
+    configure_threads(args.threads, args.interop_threads)
+    samples = load_samples(args.samples)
+    buckets = parse_buckets(args.buckets)
+
+    start = time.perf_counter()
+    model = load_model(model_name=args.model, use_finetuned=True, buckets=buckets, compile_mode=args.compile_mode)
+    results = {'model': args.model, 'buckets': list(buckets), 'load_s': round(time.perf_counter() - start, 3)}
+
+    # First call pays one-off allocator/thread-pool warmup; keep it out of steady state
+    model.summarize(samples[0])
+    results['eager'] = time_summaries(model, samples, args.runs)
+
+    if not args.skip_compile:
+        results['optimization'] = model.enable_optimizations()
+        if results['optimization']['enabled']:
+            results['optimized'] = time_summaries(model, samples, args.runs)
+            results['speedup'] = round(results['eager']['mean_s'] / results['optimized']['mean_s'], 3)
+
+    return results
+
+
+def synthetic_transcript(turns, seed=0):
+    """Meeting-like transcript with ``turns`` speaker turns"""
+    rng = random.Random(seed)
+    speakers = ['Project Manager', 'Marketing', 'User Interface', 'Industrial Designer']
+    words = ('budget remote control battery button design market price user team deadline '
+             'prototype materials yeah okay um so I think we should decide the next meeting').split()
+    return '\n'.join(
+        f'{rng.choice(speakers)}: ' + ' '.join(rng.choice(words) for _ in range(rng.randint(1, 30)))
+        for _ in range(turns)
+    )
+
+
+def time_selection(model, turns, runs):
+    """Time salience selection (excluding tokenization) on a synthetic transcript"""
+    text = synthetic_transcript(turns)
+    encoded = model.encode(text)
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        _, info = model.salience.select(text, encoded)
+        latencies.append(time.perf_counter() - start)
+    return {
+        'turns': turns,
+        'input_tokens': encoded.token_count,
+        'selected_turns': info.get('selected_turns', 0),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def strategy_inputs(model, text):
+    """Model input for each long-input strategy"""
+    encoded = model.encode(text)
+    window = model.max_input_tokens
+    return {
+        'truncate': encoded.truncate(window),
+        'chunked': apply_token_budget(encoded, window, encoded.token_count)[0],
+        'salience': apply_token_budget(encoded, window, encoded.token_count, selector=model.salience, text=text)[0],
+    }
+
+
+def run_salience_benchmark(args):
+    try:
+        from rouge_score import rouge_scorer
+    except ImportError:
+        raise SystemExit('Salience benchmark requires rouge-score (pip install rouge-score)')
+    from datasets import load_dataset
+
+    configure_threads(args.threads, args.interop_threads)
+    model = load_model(model_name=args.model, use_finetuned=True)
+    results = {'model': args.model, 'selection': time_selection(model, args.turns, args.runs)}
+
+    dataset = load_dataset(args.dataset, split=args.split)
+    samples = [row for row in dataset if model.encode(row['dialogue']).token_count > model.max_input_tokens]
+    samples = samples[:args.limit]
+    if not samples:
+        raise SystemExit(f'No {args.dataset} samples exceed the {model.max_input_tokens}-token window')
+
+    scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
+    scores = {name: {'rouge1': [], 'rouge2': [], 'rougeL': [], 'latency_s': []}
+              for name in ('truncate', 'chunked', 'salience')}
+    for row in samples:
+        for name, encoded in strategy_inputs(model, row['dialogue']).items():
+            start = time.perf_counter()
+            summary = model.summarize(row['dialogue'], encoded=encoded)
+            scores[name]['latency_s'].append(time.perf_counter() - start)
+            for metric, value in scorer.score(row['summary'], summary).items():
+                scores[name][metric].append(value.fmeasure)
+
+    results['samples'] = len(samples)
+    results['strategies'] = {
+        name: {metric: round(statistics.mean(values), 4) for metric, values in metrics.items()}
+        for name, metrics in scores.items()
+    }
+    return results
+
+
+def print_salience_report(results):
+    selection = results['selection']
+    print(f"Model: {results['model']}")
+    print(f"Selection: {selection['turns']} turns / {selection['input_tokens']} tokens -> "
+          f"{selection['selected_turns']} turns in {selection['mean_ms']:.1f}ms (max {selection['max_ms']:.1f}ms)")
+    print(f"ROUGE F1 on {results['samples']} over-window transcripts:")
+    for name, metrics in results['strategies'].items():
+        print(f"  {name:<9} R1 {metrics['rouge1']:.4f}  R2 {metrics['rouge2']:.4f}  RL {metrics['rougeL']:.4f}  "
+              f"mean {metrics['latency_s']:.3f}s")
+
+
+def measure_decoding(args):
+    """Latency, decoder steps and peak RSS of one decoding engine (run in its own process)"""
+    configure_threads(args.threads, args.interop_threads)
+    samples = load_samples(args.samples)
+    model = load_model(model_name=args.model, use_finetuned=True, static_cache=args.engine == 'static')
+
+    if model.decoder is not None:
+        count_steps = lambda: model.decoder.steps
+    else:
+        calls = [0]
+        model.model.get_decoder().register_forward_hook(lambda *_: calls.__setitem__(0, calls[0] + 1))
+        count_steps = lambda: calls[0]
+
+    model.summarize(samples[0])
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    steps_before = count_steps()
+
+    def timed(text):
+        start = time.perf_counter()
+        model.summarize(text)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(timed, samples * args.runs))
+    wall = time.perf_counter() - start
+    steps = count_steps() - steps_before
+
+    results = {
+        'engine': args.engine,
+        'concurrency': args.concurrency,
+        'requests': len(latencies),
+        'mean_s': round(statistics.mean(latencies), 4),
+        'p50_s': round(statistics.median(latencies), 4),
+        'wall_s': round(wall, 3),
+        'decoder_steps': steps,
+        'ms_per_step': round(sum(latencies) / max(steps, 1) * 1000, 3),
+        # ru_maxrss is KiB on Linux
+        'after_warmup_rss_mb': round(baseline_rss / 1024, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if model.decoder is not None:
+        results['kv_cache_pool'] = model.decoder.pool.stats()
+    return results
+
+
+def run_decoding_benchmark(args):
+    """Measure each engine in a fresh process so peak RSS is not shared"""
+    results = {'model': args.model, 'engines': {}}
+    for engine in ('hf', 'static'):
+        command = [sys.executable, os.path.abspath(__file__), '--mode', 'decoding', '--engine', engine,
+                   '--model', args.model, '--samples', args.samples, '--runs', str(args.runs),
+                   '--concurrency', str(args.concurrency), '--threads', str(args.threads),
+                   '--interop-threads', str(args.interop_threads)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results['engines'][engine] = json.loads(output.strip().splitlines()[-1])
+    hf, static = results['engines']['hf'], results['engines']['static']
+    results['step_speedup'] = round(hf['ms_per_step'] / static['ms_per_step'], 3)
+    results['peak_rss_saved_mb'] = round(hf['peak_rss_mb'] - static['peak_rss_mb'], 1)
+    return results
+
+
+def print_decoding_report(results):
+    print(f"Model: {results['model']}")
+    for name, engine in results['engines'].items():
+        print(f"  {name:<7} mean {engine['mean_s']:.3f}s  {engine['ms_per_step']:.2f} ms/step  "
+              f"peak RSS {engine['peak_rss_mb']:.0f} MB (after warmup {engine['after_warmup_rss_mb']:.0f} MB)  "
+              f"concurrency {engine['concurrency']}")
+    print(f"Per-step speedup x{results['step_speedup']:.2f}, peak RSS saved {results['peak_rss_saved_mb']:.0f} MB")
+
+
+def print_report(results):
+    print(f"Model: {results['model']}  buckets: {results['buckets'] or 'off'}")
+    print(f"Load time: {results['load_s']:.2f}s")
+    print(f"Eager      mean {results['eager']['mean_s']:.3f}s  p50 {results['eager']['p50_s']:.3f}s")
+    optimization = results.get('optimization')
+    if optimization is None:
+        return
+    if not optimization['enabled']:
+        print(f"Optimized  unavailable (fell back to eager): {optimization.get('error')}")
+        return
+    print(f"Compile/warmup: {optimization['compile_seconds']:.2f}s  per bucket: {optimization['bucket_warmup_seconds']}")
+    print(f"Optimized  mean {results['optimized']['mean_s']:.3f}s  p50 {results['optimized']['p50_s']:.3f}s  "
+          f"speedup x{results['speedup']:.2f}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark MLservice summarization')
+    parser.add_argument('--mode', choices=['latency', 'salience', 'decoding'], default='latency')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', '../MLmodel/models/flan_t5_meeting_minutes'))
+    parser.add_argument('--samples', default=SAMPLES_GLOB, help='Glob of transcript files')
+    parser.add_argument('--runs', type=int, default=3, help='Passes over the sample set')
+    parser.add_argument('--buckets', default='128,256,512', help='Static input lengths ("" disables bucketing)')
+    parser.add_argument('--threads', type=int, default=0, help='Intra-op threads (0 = torch default)')
+    parser.add_argument('--interop-threads', type=int, default=0, help='Inter-op threads (0 = torch default)')
+    parser.add_argument('--compile-mode', default=None, help='torch.compile mode')
+    parser.add_argument('--skip-compile', action='store_true', help='Only measure eager mode')
+    parser.add_argument('--dataset', default='knkarthick/AMI', help='Salience mode: dialogue/summary dataset')
+    parser.add_argument('--split', default='test', help='Salience mode: dataset split')
+    parser.add_argument('--limit', type=int, default=50, help='Salience mode: max over-window transcripts')
+    parser.add_argument('--turns', type=int, default=10000, help='Salience mode: turns in the synthetic transcript')
+    parser.add_argument('--concurrency', type=int, default=4, help='Decoding mode: concurrent requests')
+    parser.add_argument('--engine', choices=['hf', 'static'], help='Decoding mode: measure only this engine')
+    parser.add_argument('--json', help='Also write results to this file')
+    return parser
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    args = build_parser().parse_args()
+    if args.mode == 'decoding' and args.engine:
+        # Child process of run_decoding_benchmark: machine-readable output only
+        print(json.dumps(measure_decoding(args)))
+        sys.exit(0)
+    if args.mode == 'decoding':
+        results = run_decoding_benchmark(args)
+        print_decoding_report(results)
+    elif args.mode == 'salience':
+        results = run_salience_benchmark(args)
+        print_salience_report(results)
+    else:
+        results = run_benchmark(args)
+        print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
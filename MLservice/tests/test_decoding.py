@@ -0,0 +1,97 @@
+"""
+Tests for the static KV cache beam search: it must pick the same sequences
+as ``model.generate`` on randomly initialised tiny T5 models
+"""
+
+import random
+
+import pytest
+import torch
+from transformers import T5Config, T5ForConditionalGeneration
+
+from utils.decoding import KVCachePool, StaticBeamSearch
+
+EOS = 1
+
+
+def tiny_t5(tied):
+    torch.manual_seed(0)
+    config = T5Config(vocab_size=300, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_decoder_layers=2,
+                      num_heads=4, decoder_start_token_id=0, pad_token_id=0, eos_token_id=EOS,
+                      tie_word_embeddings=tied)
+    return T5ForConditionalGeneration(config).eval()
+
+
+def until_eos(sequence):
+    """HF pads finished sequences after their EOS; the static decoder stops there"""
+    return sequence[:sequence.index(EOS, 1) + 1] if EOS in sequence[1:] else sequence
+
+
+@pytest.mark.parametrize('tied', [True, False])
+def test_matches_generate(tied):
+    model = tiny_t5(tied)
+    engine = StaticBeamSearch(model)
+    rng = random.Random(7)
+    for seed in range(15):
+        torch.manual_seed(seed)
+        batch, source_len = rng.randint(1, 3), rng.randint(3, 30)
+        max_length = rng.randint(5, 40)
+        settings = dict(max_length=max_length, min_length=rng.randint(0, max_length),
+                        num_beams=rng.choice([1, 2, 4]), no_repeat_ngram_size=rng.choice([0, 2, 3]))
+        input_ids = torch.randint(2, 300, (batch, source_len))
+        attention_mask = torch.ones_like(input_ids)
+        if batch > 1:
+            attention_mask[1, source_len // 2:] = 0
+            input_ids[1, source_len // 2:] = 0
+
+        expected = model.generate(input_ids, attention_mask=attention_mask, early_stopping=True,
+                                  length_penalty=2.0, **settings)
+        actual = engine.generate(input_ids, attention_mask, length_penalty=2.0, **settings)
+
+        assert [until_eos(row.tolist()) for row in expected] == actual, settings
+
+
+def test_pool_keeps_idle_caches_within_byte_bound():
+    shape = dict(layers=2, rows=4, heads=2, length=8, head_dim=4, dtype=torch.float32, device='cpu')
+    with KVCachePool().acquire(**shape) as cache:
+        cache_bytes = cache.nbytes
+    pool = KVCachePool(max_idle_bytes=2 * cache_bytes)
+
+    with pool.acquire(**shape), pool.acquire(**shape), pool.acquire(**shape):
+        pass
+    assert pool.stats()['idle'] == 2
+    assert pool.idle_bytes == 2 * cache_bytes
+
+    with pool.acquire(**shape):
+        assert pool.stats()['reused'] == 1
+        assert pool.idle_bytes == cache_bytes
+
+    with pool.acquire(**dict(shape, rows=16)):
+        pass
+    assert pool.idle_bytes <= pool.max_idle_bytes
+
+
+def test_pool_lends_prefix_of_larger_cache():
+    shape = dict(layers=2, heads=2, length=8, head_dim=4, dtype=torch.float32, device='cpu')
+    pool = KVCachePool()
+    with pool.acquire(rows=8, **shape) as large:
+        pass
+
+    with pool.acquire(rows=4, **dict(shape, length=6)) as small:
+        assert small.keys[0].shape == (4, 2, 8, 4)
+        assert small.keys[0].is_contiguous()
+        assert small.keys[0].data_ptr() == large.keys[0].data_ptr()
+    assert pool.stats()['allocated'] == 1
+    assert pool.stats()['reused'] == 1
+
+
+def test_engine_reuses_batch_cache_for_single_inputs():
+    model = tiny_t5(True)
+    engine = StaticBeamSearch(model)
+    input_ids = torch.randint(2, 300, (3, 12))
+    batched = engine.generate(input_ids, torch.ones_like(input_ids), max_length=20, min_length=0, num_beams=2)
+    single = [engine.generate(input_ids[i:i + 1], torch.ones_like(input_ids[i:i + 1]),
+                              max_length=20, min_length=0, num_beams=2)[0] for i in range(3)]
+
+    assert single == batched
+    assert engine.pool.stats()['allocated'] == 1
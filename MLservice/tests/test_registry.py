@@ -0,0 +1,104 @@
+"""
+Tests for the model registry: lazy loading, LRU eviction under the memory
+budget and hot-swapping while a model is borrowed (stub loader, no model files)
+"""
+
+import threading
+
+import torch
+
+from utils.registry import ModelRegistry
+
+MODEL_BYTES = 1024
+
+
+class StubModel:
+    """Looks like a SummarizationModel to the registry: MODEL_BYTES of parameters"""
+
+    def __init__(self, path):
+        self.path = path
+        self.model = torch.nn.ParameterList([torch.nn.Parameter(torch.empty(MODEL_BYTES // 4))])
+        self.decoder = None
+        self.optimization = {'enabled': False}
+
+
+class StubLoader:
+    def __init__(self, gate=None):
+        self.calls = []
+        self.gate = gate
+        self._lock = threading.Lock()
+
+    def __call__(self, path):
+        with self._lock:
+            self.calls.append(path)
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        return StubModel(path)
+
+
+def make_registry(names, budget_models=0, loader=None):
+    registry = ModelRegistry(memory_budget_bytes=int(budget_models * MODEL_BYTES), loader=loader or StubLoader())
+    for name in names:
+        registry.register(name, f'/models/{name}')
+    return registry
+
+
+def loaded(registry):
+    return {model['name'] for model in registry.describe()['models'] if model['loaded']}
+
+
+def test_models_load_lazily_and_once_under_concurrency():
+    gate = threading.Event()
+    loader = StubLoader(gate)
+    registry = make_registry(['a', 'b'], loader=loader)
+    assert loader.calls == []
+
+    borrowed = []
+
+    def borrow():
+        with registry.acquire('b') as (_, model):
+            borrowed.append(model)
+
+    threads = [threading.Thread(target=borrow) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == ['/models/b']
+    assert len({id(model) for model in borrowed}) == 1
+    assert loaded(registry) == {'b'}
+
+
+def test_least_recently_used_idle_model_is_evicted():
+    registry = make_registry(['a', 'b', 'c', 'd'], budget_models=3)
+    for name in ('a', 'b', 'c'):
+        registry.preload(name)
+    registry.preload('b')  # c is now the least recently used non-default model
+
+    registry.preload('d')
+
+    assert loaded(registry) == {'a', 'b', 'd'}
+
+
+def test_default_model_is_never_evicted():
+    registry = make_registry(['a', 'b', 'c'], budget_models=1)
+    registry.preload('a')
+    registry.preload('b')
+    registry.preload('c')
+
+    assert loaded(registry) == {'a'}
+
+
+def test_swapped_out_model_is_kept_while_borrowed():
+    registry = make_registry(['a', 'b'], budget_models=1.5)
+    registry.preload('a')
+
+    with registry.acquire() as (name, model):
+        registry.set_default('b')
+        assert registry.default_name == 'b'
+        assert loaded(registry) == {'a', 'b'}
+        assert name == 'a' and model.path == '/models/a'
+
+    assert loaded(registry) == {'b'}
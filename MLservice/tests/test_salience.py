@@ -0,0 +1,86 @@
+"""
+Tests for extractive salience pre-selection (no model download needed)
+"""
+
+import numpy as np
+
+from utils.salience import SalienceSelector, select_turns, split_long_turns
+from utils.validation import EncodedTranscript, apply_token_budget
+
+PREFIX_IDS = [10, 11]
+EOS = 1
+
+
+class WordTokenizer:
+    """Minimal stand-in: the selector only needs the EOS id and vocabulary size"""
+
+    eos_token_id = EOS
+
+    def __len__(self):
+        return 1000
+
+
+def encode_words(text):
+    """EncodedTranscript with one token per whitespace-separated word"""
+    ids, offsets, start = [], [], 0
+    for word in text.split(' '):
+        ids.append(100 + sum(map(ord, word)) % 900)
+        offsets.append(start)
+        start += len(word) + 1
+    return EncodedTranscript(PREFIX_IDS + ids + [EOS], len(PREFIX_IDS),
+                             offsets=np.array([-1, -1] + offsets + [len(text)]))
+
+
+def test_select_turns_skips_turns_that_do_not_fit():
+    selected = select_turns(np.array([3.0, 2.0, 1.0]), np.array([300, 300, 100]), 500)
+    assert selected.tolist() == [True, False, True]
+
+
+def test_select_turns_ignores_empty_turns():
+    selected = select_turns(np.array([5.0, 2.0, 1.0]), np.array([0, 600, 50]), 500)
+    assert selected.tolist() == [False, False, True]
+
+
+def test_split_long_turns_caps_piece_length():
+    token_turn = np.array([0] * 10 + [2] * 3)
+    pieces, n_pieces = split_long_turns(token_turn, 4)
+    assert n_pieces == 4
+    assert np.bincount(pieces).tolist() == [4, 4, 2, 3]
+
+
+def test_long_monologue_is_still_selected():
+    text = ' '.join(f'w{i % 97}' for i in range(2000))
+    encoded = encode_words(text)
+    selector = SalienceSelector(WordTokenizer(), PREFIX_IDS, window=512)
+
+    selected, info = selector.select(text, encoded)
+
+    assert selected is not None
+    assert 0 < selected.token_count <= 512
+    assert info['dropped_tokens'] == encoded.token_count - selected.token_count
+
+
+def test_one_oversized_turn_does_not_block_selection():
+    turns = ['short turn about the budget'] * 5 + [' '.join(f'long{i}' for i in range(900))]
+    text = '\n'.join(turns)
+    encoded = encode_words(text)
+    selector = SalienceSelector(WordTokenizer(), PREFIX_IDS, window=512)
+
+    selected, info = selector.select(text, encoded)
+
+    assert selected is not None
+    assert info['selected_tokens'] == selected.token_count <= 512
+    assert info['total_turns'] == 6
+
+
+def test_token_budget_reports_dropped_tokens():
+    text = '\n'.join(' '.join(f't{turn}x{i}' for i in range(40)) for turn in range(50))
+    encoded = encode_words(text)
+    selector = SalienceSelector(WordTokenizer(), PREFIX_IDS, window=512)
+
+    selected, stats = apply_token_budget(encoded, 512, 4096, selector=selector, text=text)
+
+    assert stats['chunks'] == 1
+    assert stats['truncated']
+    assert stats['truncated_tokens'] == encoded.token_count - selected.token_count
+    assert stats['extractive']['dropped_tokens'] == stats['truncated_tokens']
@@ -0,0 +1,104 @@
+"""
+Tests for token-budget validation: window splitting and the token-bounded
+encoding cache (stub tokenizer, no model download needed)
+"""
+
+from utils.validation import TASK_PREFIX, EncodedTranscript, TokenCounter, apply_token_budget
+
+EOS = 1
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word, plus EOS unless disabled"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _encode(self, text, add_special_tokens=True):
+        ids, offsets, start = [], [], 0
+        for word in text.split(' '):
+            ids.append(100 + len(word))
+            offsets.append((start, start + len(word)))
+            start += len(word) + 1
+        if add_special_tokens:
+            ids.append(EOS)
+            offsets.append((0, 0))
+        return ids, offsets
+
+    def __call__(self, texts, add_special_tokens=True, truncation=False, return_offsets_mapping=False):
+        if isinstance(texts, str):
+            return {'input_ids': self._encode(texts, add_special_tokens)[0]}
+        self.calls += 1
+        encoded = [self._encode(text, add_special_tokens) for text in texts]
+        return {'input_ids': [ids for ids, _ in encoded], 'offset_mapping': [offsets for _, offsets in encoded]}
+
+
+def transcript(words):
+    return ' '.join(f'w{i}' for i in range(words))
+
+
+def test_windows_keep_prefix_and_eos_in_every_window():
+    prefix = [10, 11]
+    body = list(range(100, 125))
+    encoded = EncodedTranscript(prefix + body + [EOS], len(prefix))
+
+    windows = encoded.windows(10)
+
+    assert all(len(window) <= 10 for window in windows)
+    assert all(window[:2] == prefix and window[-1] == EOS for window in windows)
+    assert [token for window in windows for token in window[2:-1]] == body
+
+
+def test_window_is_unchanged_when_input_fits():
+    encoded = EncodedTranscript([10, 100, 101, EOS], 1)
+    assert encoded.windows(4) == [[10, 100, 101, EOS]]
+
+
+def test_truncate_keeps_eos_and_reports_dropped_tokens():
+    encoded = EncodedTranscript([10] + list(range(100, 120)) + [EOS], 1)
+    limited = encoded.truncate(8)
+
+    assert limited.token_count == 8
+    assert limited.input_ids[-1] == EOS
+    assert limited.truncated_tokens == encoded.token_count - 8
+
+
+def test_token_counter_caches_and_strips_prefix_offsets():
+    tokenizer = WordTokenizer()
+    counter = TokenCounter(tokenizer)
+    text = transcript(5)
+
+    first = counter.encode(text)
+    assert counter.encode(text) is first
+    assert tokenizer.calls == 1
+    assert first.prefix_len == len(TASK_PREFIX.split())
+    assert first.offsets[first.prefix_len] == 0  # offsets are relative to the transcript
+
+
+def test_token_counter_evicts_least_recently_used_by_tokens():
+    counter = TokenCounter(WordTokenizer(), max_cached_tokens=30)
+    texts = [transcript(8), transcript(9), transcript(10)]  # 10, 11 and 12 tokens with prefix and EOS
+    encoded = counter.encode_batch(texts[:2])
+    counter.encode(texts[0])  # texts[1] becomes least recently used
+
+    counter.encode(texts[2])
+
+    assert counter.cached_tokens == encoded[0].token_count + 12 == sum(
+        item.token_count for item in counter._cache.values())
+    assert counter.cached_tokens <= counter.max_cached_tokens
+    assert counter.encode(texts[0]) is encoded[0]
+    assert counter.encode(texts[1]) is not encoded[1]
+
+
+def test_token_counter_does_not_cache_oversized_entries():
+    counter = TokenCounter(WordTokenizer(), max_cached_tokens=10)
+    counter.encode(transcript(50))
+    assert counter.cached_tokens == 0 and not counter._cache
+
+
+def test_budget_routes_over_window_input_to_chunks():
+    encoded = EncodedTranscript([10] + list(range(100, 130)) + [EOS], 1)
+    limited, stats = apply_token_budget(encoded, window=10, max_tokens=20)
+
+    assert stats == {'input_tokens': 32, 'chunks': len(limited.windows(10)), 'truncated': True,
+                     'truncated_tokens': 12}
@@ -0,0 +1,94 @@
+"""
+Batch request parsing and scheduling helpers for /summarize/batch
+"""
+
+import json
+
+
+def parse_batch_body(body, content_type=''):
+    """
+    Parse a batch body into independent items
+
+    Accepts a JSON array, ``{"transcripts": [...]}`` or NDJSON (one item per
+    line). Items are either transcript strings or ``{"id": ..., "transcript": ...}``.
+    A malformed NDJSON line only fails that item.
+
+    Deliberately duplicated in ``backend/batch.py``: the backend and MLservice
+    are deployed separately and share no package, so keep both in sync.
+
+    Args:
+        body: Raw request body (str or bytes)
+        content_type: Request Content-Type header
+
+    Returns:
+        List of dicts with 'id', 'transcript' and optionally 'error'
+
+    Raises:
+        ValueError: If the body as a whole cannot be parsed
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+
+    if 'ndjson' not in content_type and 'jsonlines' not in content_type:
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get('transcripts'), list):
+            data = data['transcripts']
+        if isinstance(data, list):
+            return [_normalize_item(item) for item in data]
+
+    items = []
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(_normalize_item(json.loads(line)))
+        except json.JSONDecodeError:
+            items.append({'id': None, 'transcript': None, 'error': 'Invalid JSON line'})
+    if not items:
+        raise ValueError('Body must be a JSON array or NDJSON')
+    return items
+
+
+def _normalize_item(item):
+    if isinstance(item, str):
+        return {'id': None, 'transcript': item}
+    if isinstance(item, dict):
+        return {'id': item.get('id'), 'transcript': item.get('transcript')}
+    return {'id': None, 'transcript': None, 'error': 'Item must be a string or an object'}
+
+
+def length_sorted_batches(items, batch_size, key, weight=None):
+    """
+    Group items into batches of similar length to minimise padding
+
+    Args:
+        items: Items to schedule
+        batch_size: Max model inputs per generate call
+        key: Callable returning an item's length
+        weight: Callable returning how many model inputs an item needs
+            (e.g. its chunk count); 1 per item if None. An item heavier than
+            ``batch_size`` gets a batch of its own.
+
+    Returns:
+        List of item lists, shortest first
+    """
+    batches, current, current_weight = [], [], 0
+    for item in sorted(items, key=key):
+        item_weight = weight(item) if weight else 1
+        if current and current_weight + item_weight > batch_size:
+            batches.append(current)
+            current, current_weight = [], 0
+        current.append(item)
+        current_weight += item_weight
+    if current:
+        batches.append(current)
+    return batches
+
+
+def ndjson_line(record):
+    """Serialize one streamed result line"""
+    return json.dumps(record) + '\n'
@@ -0,0 +1,370 @@
+"""
+Static-cache beam search for T5
+
+``model.generate`` grows past key/values by concatenation and reorders them
+with fresh ``index_select`` copies at every step, for every beam. This
+decoder instead runs the T5 decoder step directly on pre-allocated key/value
+buffers sized for ``max_length``, borrowed from a pool and reused across
+requests, reorders beams in place, and blocks repeated n-grams with an
+incremental per-beam index instead of rescanning every hypothesis.
+
+Beam selection follows ``generate(num_beams=..., early_stopping=True,
+length_penalty=..., min_length=..., no_repeat_ngram_size=...)``.
+"""
+
+import math
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+import torch
+from torch.profiler import record_function
+from transformers.models.t5.modeling_t5 import T5Attention
+
+
+class StaticKVCache:
+    """
+    Self-attention keys/values for ``rows`` beams of up to ``length`` steps
+
+    Buffers are laid out ``[rows, heads, length, head_dim]`` so attention
+    reads a prefix view without copying, and the first ``n`` rows are a
+    contiguous view usable as a smaller cache. Buffers are left uninitialized:
+    every position is written before it is read.
+    """
+
+    def __init__(self, layers, rows, heads, length, head_dim, dtype, device):
+        shape = (rows, heads, length, head_dim)
+        self.rows, self.length = rows, length
+        self.keys = [torch.empty(shape, dtype=dtype, device=device) for _ in range(layers)]
+        self.values = [torch.empty(shape, dtype=dtype, device=device) for _ in range(layers)]
+        self._scratch = torch.empty(shape, dtype=dtype, device=device)
+
+    @property
+    def nbytes(self):
+        return sum(t.numel() * t.element_size() for t in self.keys + self.values + [self._scratch])
+
+    def narrow(self, rows):
+        """Cache over the first ``rows`` rows, sharing this cache's memory"""
+        if rows == self.rows:
+            return self
+        view = object.__new__(StaticKVCache)
+        view.rows, view.length = rows, self.length
+        view.keys = [buffer[:rows] for buffer in self.keys]
+        view.values = [buffer[:rows] for buffer in self.values]
+        view._scratch = self._scratch[:rows]
+        return view
+
+    def reorder(self, parents, steps):
+        """Make row ``i`` hold the first ``steps`` positions of row ``parents[i]``"""
+        scratch = self._scratch[:, :, :steps]
+        for buffer in self.keys + self.values:
+            filled = buffer[:, :, :steps]
+            torch.index_select(filled, 0, parents, out=scratch)
+            filled.copy_(scratch)
+
+
+class KVCachePool:
+    """
+    Reuses StaticKVCache buffers across requests
+
+    An idle cache is reused by any request that needs at most its rows and
+    length (the smallest such cache is taken), so smaller batches borrow the
+    prefix of a batch-sized cache instead of allocating. Released caches are
+    kept, least recently used first out, while their total size stays within
+    ``max_idle_bytes``; a cache larger than the whole bound is never kept.
+    """
+
+    def __init__(self, max_idle_bytes=640 * 1024 * 1024):
+        self.max_idle_bytes = max_idle_bytes
+        self.idle_bytes = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    @contextmanager
+    def acquire(self, layers, rows, heads, length, head_dim, dtype, device):
+        key = (layers, heads, head_dim, dtype, str(device))
+        with self._lock:
+            fitting = [i for i, (k, cache) in enumerate(self._idle)
+                       if k == key and cache.rows >= rows and cache.length >= length]
+            cache = None
+            if fitting:
+                index = min(fitting, key=lambda i: self._idle[i][1].nbytes)
+                cache = self._idle.pop(index)[1]
+                self.idle_bytes -= cache.nbytes
+                self.reused += 1
+            else:
+                self.allocated += 1
+        if cache is None:
+            cache = StaticKVCache(layers, rows, heads, length, head_dim, dtype, device)
+        try:
+            yield cache.narrow(rows)
+        finally:
+            with self._lock:
+                self._idle.append((key, cache))
+                self.idle_bytes += cache.nbytes
+                while self._idle and self.idle_bytes > self.max_idle_bytes:
+                    self.idle_bytes -= self._idle.pop(0)[1].nbytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                'idle': len(self._idle),
+                'idle_bytes': self.idle_bytes,
+                'max_idle_bytes': self.max_idle_bytes,
+                'allocated': self.allocated,
+                'reused': self.reused,
+            }
+
+
+class NgramIndex:
+    """
+    Per-beam index of seen n-grams: (n-1)-token prefix -> next tokens
+
+    Each step only adds the newest n-gram per beam instead of rescanning
+    every hypothesis. When several beams fork from one parent, the last takes
+    over the parent's index and the others copy it, so a fork costs
+    O(history) for that beam.
+    """
+
+    def __init__(self, size, rows, start_token):
+        self.size = size
+        self.tails = [self._trim((start_token,))] * rows
+        self.seen = [{(): frozenset([start_token])} if size == 1 else {} for _ in range(rows)]
+
+    def _trim(self, tail):
+        return tail[max(len(tail) - (self.size - 1), 0):]
+
+    def banned(self):
+        """(row, token) pairs that would repeat an n-gram"""
+        rows, tokens = [], []
+        for row, (tail, seen) in enumerate(zip(self.tails, self.seen)):
+            if len(tail) == self.size - 1:
+                for token in seen.get(tail, ()):
+                    rows.append(row)
+                    tokens.append(token)
+        return rows, tokens
+
+    def advance(self, parents, tokens):
+        """Extend each row with ``tokens[row]`` after its parent's history"""
+        children = defaultdict(list)
+        for row, parent in enumerate(parents):
+            children[parent].append(row)
+
+        seen, tails = [None] * len(parents), [None] * len(parents)
+        for parent, rows in children.items():
+            tail = self.tails[parent]
+            for i, row in enumerate(rows):
+                index = self.seen[parent] if i == len(rows) - 1 else dict(self.seen[parent])
+                token = tokens[row]
+                if len(tail) == self.size - 1:
+                    index[tail] = index.get(tail, frozenset()) | {token}
+                seen[row] = index
+                tails[row] = self._trim(tail + (token,))
+        self.seen, self.tails = seen, tails
+
+
+class StaticBeamSearch:
+    """Beam search over a T5ForConditionalGeneration using pooled static caches"""
+
+    def __init__(self, model, max_idle_cache_bytes=640 * 1024 * 1024):
+        config = model.config
+        self.model = model
+        self.encoder = model.get_encoder()
+        self.decoder = model.get_decoder()
+        self.heads = config.num_heads
+        self.head_dim = config.d_kv
+        self.layers = len(self.decoder.block)
+        self.output_scale = config.d_model ** -0.5 if getattr(
+            config, 'scale_decoder_outputs', config.tie_word_embeddings) else None
+
+        generation = model.generation_config
+        self.start_token = generation.decoder_start_token_id if generation.decoder_start_token_id is not None \
+            else config.decoder_start_token_id
+        self.eos_token = generation.eos_token_id if generation.eos_token_id is not None else config.eos_token_id
+
+        self.pool = KVCachePool(max_idle_bytes=max_idle_cache_bytes)
+        self.steps = 0
+        self._bias = None
+        self._bias_lock = threading.Lock()
+
+    def _position_bias(self, length, dtype, device):
+        """
+        Decoder self-attention bias as ``[heads, length]`` for distances
+        ``length - 1 .. 0``; step ``t`` uses the last ``t + 1`` columns
+        """
+        with self._bias_lock:
+            if self._bias is None or self._bias.shape[1] < length:
+                attention = self.decoder.block[0].layer[0].SelfAttention
+                distance = torch.arange(-(length - 1), 1, device=device)
+                buckets = T5Attention._relative_position_bucket(
+                    distance,
+                    bidirectional=False,
+                    num_buckets=attention.relative_attention_num_buckets,
+                    max_distance=attention.relative_attention_max_distance,
+                )
+                self._bias = attention.relative_attention_bias(buckets).t().to(dtype).contiguous()
+            return self._bias[:, self._bias.shape[1] - length:]
+
+    def _cross_states(self, encoder_states):
+        """Cross-attention keys/values, computed once per batch and shared by its beams"""
+        batch, source_len, _ = encoder_states.shape
+        states = []
+        for block in self.decoder.block:
+            attention = block.layer[1].EncDecAttention
+            key = attention.k(encoder_states).view(batch, source_len, self.heads, self.head_dim).transpose(1, 2)
+            value = attention.v(encoder_states).view(batch, source_len, self.heads, self.head_dim).transpose(1, 2)
+            states.append((key, value))
+        return states
+
+    def _step(self, tokens, position, cache, cross, cross_bias, self_bias, num_beams):
+        """Logits for the next token of every beam; writes this step's keys/values"""
+        rows = tokens.shape[0]
+        batch = rows // num_beams
+        hidden = self.decoder.embed_tokens(tokens)
+        bias = self_bias[:, self_bias.shape[1] - position - 1:]
+
+        for layer, block in enumerate(self.decoder.block):
+            attention = block.layer[0].SelfAttention
+            normed = block.layer[0].layer_norm(hidden)
+            query = attention.q(normed).view(rows, self.heads, 1, self.head_dim)
+            cache.keys[layer][:, :, position] = attention.k(normed).view(rows, self.heads, self.head_dim)
+            cache.values[layer][:, :, position] = attention.v(normed).view(rows, self.heads, self.head_dim)
+            keys = cache.keys[layer][:, :, :position + 1]
+            values = cache.values[layer][:, :, :position + 1]
+            scores = torch.matmul(query, keys.transpose(-1, -2)) + bias[:, None, :]
+            weights = torch.softmax(scores.float(), dim=-1).type_as(scores)
+            context = torch.matmul(weights, values).view(rows, self.heads * self.head_dim)
+            hidden = hidden + attention.o(context)
+
+            attention = block.layer[1].EncDecAttention
+            normed = block.layer[1].layer_norm(hidden)
+            # [batch, heads, beams, head_dim] so every beam attends to one copy of the encoder states
+            query = attention.q(normed).view(batch, num_beams, self.heads, self.head_dim).transpose(1, 2)
+            keys, values = cross[layer]
+            scores = torch.matmul(query, keys.transpose(-1, -2)) + cross_bias
+            weights = torch.softmax(scores.float(), dim=-1).type_as(scores)
+            context = torch.matmul(weights, values).transpose(1, 2).reshape(rows, self.heads * self.head_dim)
+            hidden = hidden + attention.o(context)
+
+            hidden = block.layer[-1](hidden)
+
+        hidden = self.decoder.final_layer_norm(hidden)
+        if self.output_scale is not None:
+            hidden = hidden * self.output_scale
+        return self.model.lm_head(hidden)
+
+    @torch.no_grad()
+    def generate(self, input_ids, attention_mask, max_length=250, min_length=50, num_beams=4,
+                 length_penalty=2.0, no_repeat_ngram_size=3):
+        """
+        Beam search (``early_stopping=True``)
+
+        Args:
+            input_ids: [batch, source_len] encoder input
+            attention_mask: [batch, source_len]
+            max_length: Max decoder length, including the start token
+            min_length: Min decoder length before EOS is allowed
+            num_beams: Beams per input
+            length_penalty: Exponent on the hypothesis length when ranking finished beams
+            no_repeat_ngram_size: Block repeated n-grams of this size (0 disables)
+
+        Returns:
+            List of token id lists (start token first), one per input
+        """
+        batch = input_ids.shape[0]
+        rows = batch * num_beams
+        device = input_ids.device
+
+        encoder_states = self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        dtype = encoder_states.dtype
+        cross = self._cross_states(encoder_states)
+        cross_bias = (1.0 - attention_mask[:, None, None, :].to(dtype)) * torch.finfo(dtype).min
+        self_bias = self._position_bias(max_length, dtype, device)
+
+        beam_scores = torch.zeros((batch, num_beams), dtype=torch.float32, device=device)
+        beam_scores[:, 1:] = -1e9
+        tokens = torch.full((rows,), self.start_token, dtype=torch.long, device=device)
+        row_offset = (torch.arange(batch, device=device) * num_beams)[:, None]
+        identity = list(range(rows))
+        ngrams = NgramIndex(no_repeat_ngram_size, rows, self.start_token) if no_repeat_ngram_size > 0 else None
+
+        # Hypotheses are rebuilt from per-step tokens and parent rows only when finished
+        history_tokens, history_parents = [], []
+        finished = [[] for _ in range(batch)]
+        done = [False] * batch
+
+        with self.pool.acquire(self.layers, rows, self.heads, max_length, self.head_dim, dtype, device) as cache:
+            for step in range(max_length - 1):
+                cur_len = step + 1
+                with record_function('decoder_step'):
+                    logits = self._step(tokens, step, cache, cross, cross_bias, self_bias, num_beams)
+                self.steps += 1
+
+                log_probs = torch.log_softmax(logits.float(), dim=-1)
+                if cur_len < min_length:
+                    log_probs[:, self.eos_token] = -math.inf
+                if ngrams is not None:
+                    banned_rows, banned_tokens = ngrams.banned()
+                    if banned_rows:
+                        log_probs[banned_rows, banned_tokens] = -math.inf
+
+                vocab = log_probs.shape[-1]
+                candidates = (log_probs.view(batch, num_beams, vocab) + beam_scores[:, :, None]).view(batch, -1)
+                top_scores, top_indices = torch.topk(candidates, 2 * num_beams)
+                top_beams = top_indices // vocab
+                top_tokens = top_indices % vocab
+                last_step = cur_len + 1 >= max_length
+                hits = top_tokens == self.eos_token
+                if last_step:
+                    hits.fill_(True)
+
+                self._collect_finished(finished, done, top_scores, top_beams, top_tokens, hits,
+                                       step, num_beams, length_penalty)
+                if last_step or all(done):
+                    break
+
+                running = top_scores + hits.float() * -1e9
+                beam_scores, keep = torch.topk(running, num_beams)
+                parents = (torch.gather(top_beams, 1, keep) + row_offset).view(-1)
+                tokens = torch.gather(top_tokens, 1, keep).view(-1)
+
+                parent_list, token_list = parents.tolist(), tokens.tolist()
+                history_parents.append(parent_list)
+                history_tokens.append(token_list)
+                if ngrams is not None:
+                    ngrams.advance(parent_list, token_list)
+                if parent_list != identity:
+                    cache.reorder(parents, step + 1)
+
+        return [self._backtrack(max(hyps, key=lambda hyp: hyp[0]), history_tokens, history_parents)
+                for hyps in finished]
+
+    def _collect_finished(self, finished, done, top_scores, top_beams, top_tokens, hits,
+                          step, num_beams, length_penalty):
+        """Add top-ranked candidates that end here, keeping the best ``num_beams`` per input"""
+        if not hits[:, :num_beams].any():
+            return
+        denominator = (step + 1) ** length_penalty
+        scores = top_scores[:, :num_beams].tolist()
+        beams = top_beams[:, :num_beams].tolist()
+        ends = top_tokens[:, :num_beams].tolist()
+        flags = hits[:, :num_beams].tolist()
+        for b, hyps in enumerate(finished):
+            if done[b]:
+                continue
+            new = [(scores[b][j] / denominator, step, b * num_beams + beams[b][j], ends[b][j])
+                   for j in range(num_beams) if flags[b][j]]
+            if new:
+                hyps[:] = sorted(hyps + new, key=lambda hyp: -hyp[0])[:num_beams]
+                done[b] = len(hyps) == num_beams
+
+    def _backtrack(self, hypothesis, history_tokens, history_parents):
+        _, step, row, last = hypothesis
+        sequence = [last]
+        for s in range(step - 1, -1, -1):
+            sequence.append(history_tokens[s][row])
+            row = history_parents[s][row]
+        sequence.append(self.start_token)
+        return sequence[::-1]
@@ -3,9 +3,16 @@ Model loading and inference utilities
 """
 
 import torch
-from transformers import T5ForConditionalGeneration, T5Tokenizer
+from torch.profiler import record_function
+from transformers import T5ForConditionalGeneration, T5TokenizerFast
 import logging
 import os
+import time
+
+from utils.decoding import StaticBeamSearch
+from utils.optimize import COMPILE_ERRORS, compile_model, pad_to_bucket, warmup
+from utils.salience import SalienceSelector
+from utils.validation import TokenCounter
 
 logger = logging.getLogger(__name__)
 
@@ -13,13 +20,23 @@ logger = logging.getLogger(__name__)
 class SummarizationModel:
     """T5-based summarization model for meeting transcripts (fine-tuned on AMI corpus)"""
     
-    def __init__(self, model_name='../MLmodel/models/flan_t5_meeting_minutes', use_finetuned=True):
+    def __init__(self, model_name='../MLmodel/models/flan_t5_meeting_minutes', use_finetuned=True,
+                 optimize=False, buckets=None, compile_mode=None, max_input_tokens=512, token_cache_tokens=1_000_000,
+                 static_cache=False, kv_cache_pool_bytes=640 * 1024 * 1024, fallback_model='t5-base'):
         """
         Initialize the summarization model
         
         Args:
             model_name: Path to model or base model name from Hugging Face
             use_finetuned: Whether to load fine-tuned model (default: True)
+            optimize: Compile encoder/decoder with torch.compile (falls back to eager)
+            buckets: Static input lengths to pad to, e.g. (128, 256, 512)
+            compile_mode: torch.compile mode (None = default)
+            max_input_tokens: Model input window; longer inputs are chunked
+            token_cache_tokens: Max total tokens of encoded transcripts kept cached
+            static_cache: Decode with pooled pre-allocated KV caches instead of model.generate
+            kv_cache_pool_bytes: Max size of idle KV caches kept for reuse (static_cache only)
+            fallback_model: Checkpoint to load if model_name fails (None = raise instead)
         """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         logger.info(f'Using device: {self.device}')
@@ -42,7 +59,7 @@ class SummarizationModel:
             
             # Try to load from local path
             logger.info('Attempting to load tokenizer...')
-            self.tokenizer = T5Tokenizer.from_pretrained(model_name, local_files_only=False)
+            self.tokenizer = T5TokenizerFast.from_pretrained(model_name, local_files_only=False)
             logger.info('Tokenizer loaded successfully')
             
             logger.info('Attempting to load model...')
@@ -54,24 +71,157 @@ class SummarizationModel:
             logger.info('Model loaded successfully from fine-tuned checkpoint')
             
         except Exception as e:
+            if fallback_model is None:
+                raise
             logger.warning(f'Could not load from {model_name}: {e}')
-            logger.info(f'Falling back to base model: t5-base')
-            self.tokenizer = T5Tokenizer.from_pretrained('t5-base')
-            self.model = T5ForConditionalGeneration.from_pretrained('t5-base')
+            logger.info(f'Falling back to base model: {fallback_model}')
+            self.tokenizer = T5TokenizerFast.from_pretrained(fallback_model)
+            self.model = T5ForConditionalGeneration.from_pretrained(fallback_model)
         
         self.model.to(self.device)
         self.model.eval()
+        
+        self.max_input_tokens = max_input_tokens
+        self.token_counter = TokenCounter(self.tokenizer, max_cached_tokens=token_cache_tokens)
+        self.salience = SalienceSelector(self.tokenizer, self.token_counter.prefix_ids, max_input_tokens)
+        self.decoder = StaticBeamSearch(self.model, max_idle_cache_bytes=kv_cache_pool_bytes) if static_cache else None
+        
+        self.buckets = tuple(buckets or ())
+        self.compile_mode = compile_mode
+        self.optimization = {'enabled': False}
+        self._restore_eager = None
+        if optimize:
+            self.enable_optimizations()
         logger.info('Model ready for inference')
     
-    def summarize(self, text, max_length=250, min_length=50, num_beams=4):
+    def _generate(self, input_ids, attention_mask, max_length=250, min_length=50, num_beams=4):
+        """Run beam search on already tokenized inputs, falling back to eager if compilation fails"""
+        try:
+            return self._beam_search(input_ids, attention_mask, max_length, min_length, num_beams)
+        except COMPILE_ERRORS as e:
+            if self._restore_eager is None:
+                raise
+            self._disable_optimizations(e)
+            return self._beam_search(input_ids, attention_mask, max_length, min_length, num_beams)
+    
+    def _beam_search(self, input_ids, attention_mask, max_length, min_length, num_beams):
+        with torch.no_grad(), record_function('generate'):
+            if self.decoder is not None:
+                sequences = self.decoder.generate(
+                    input_ids,
+                    attention_mask,
+                    max_length=max_length,
+                    min_length=min_length,
+                    num_beams=num_beams,
+                    length_penalty=2.0,
+                    no_repeat_ngram_size=3
+                )
+                return self._pad_sequences(sequences)
+            return self.model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                max_length=max_length,
+                min_length=min_length,
+                num_beams=num_beams,
+                early_stopping=True,
+                length_penalty=2.0,
+                no_repeat_ngram_size=3
+            )
+    
+    def _pad_sequences(self, sequences):
+        longest = max(len(ids) for ids in sequences)
+        padded = torch.full((len(sequences), longest), self.tokenizer.pad_token_id, dtype=torch.long)
+        for row, ids in enumerate(sequences):
+            padded[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        return padded
+    
+    def _warmup_run(self, seq_len, batch_size=1):
+        """Short generation at a given input shape to trigger compilation"""
+        input_ids = torch.full((batch_size, seq_len), self.tokenizer.unk_token_id, dtype=torch.long, device=self.device)
+        attention_mask = torch.ones_like(input_ids)
+        self._beam_search(input_ids, attention_mask, max_length=8, min_length=1, num_beams=4)
+    
+    def _disable_optimizations(self, error):
+        """Restore eager forwards after a compile failure at serving time"""
+        restore, self._restore_eager = self._restore_eager, None
+        if restore is None:
+            return
+        restore()
+        logger.warning(f'torch.compile failed while serving, falling back to eager mode: {error}')
+        self.optimization = {'enabled': False, 'error': str(error), 'fallback': 'runtime'}
+    
+    def enable_optimizations(self):
+        """
+        Compile the encoder and decoder step and warm up every input bucket
+        
+        Falls back to eager mode if compilation fails.
+        
+        Returns:
+            Dict describing the optimization state and startup cost
+        """
+        start = time.perf_counter()
+        logger.info(f'Compiling model (mode={self.compile_mode}, buckets={self.buckets})')
+        restore = compile_model(self.model, mode=self.compile_mode)
+        try:
+            timings = warmup(self._warmup_run, self.buckets or (512,))
+        except Exception as e:
+            restore()
+            logger.warning(f'torch.compile failed, falling back to eager mode: {e}')
+            self.optimization = {'enabled': False, 'error': str(e), 'fallback': 'warmup'}
+            return self.optimization
+        
+        self._restore_eager = restore
+        self.optimization = {
+            'enabled': True,
+            'compile_seconds': round(time.perf_counter() - start, 3),
+            'bucket_warmup_seconds': timings,
+        }
+        logger.info(f'Model compiled in {self.optimization["compile_seconds"]:.1f}s')
+        return self.optimization
+    
+    def encode(self, text):
+        """Tokenize a transcript once (cached); see utils.validation"""
+        return self.token_counter.encode(text)
+    
+    def encode_batch(self, texts):
+        """Tokenize many transcripts in one fast-tokenizer call (cached)"""
+        return self.token_counter.encode_batch(texts)
+    
+    def _summarize_windows(self, windows, max_length, min_length, num_beams):
+        """Run one generate call over pre-tokenized, window-sized inputs"""
+        longest = max(len(ids) for ids in windows)
+        input_ids = torch.full((len(windows), longest), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(windows), longest), dtype=torch.long)
+        for row, ids in enumerate(windows):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        
+        if self.buckets:
+            # Pad to a fixed length so compiled graphs are reused
+            input_ids, attention_mask = pad_to_bucket(
+                input_ids, attention_mask, self.buckets, self.tokenizer.pad_token_id)
+        
+        input_ids = input_ids.to(self.device)
+        attention_mask = attention_mask.to(self.device)
+        logger.info(f'Input tokens shape: {input_ids.shape}')
+        
+        summary_ids = self._generate(input_ids, attention_mask, max_length, min_length, num_beams)
+        logger.info(f'Summary tokens generated: {summary_ids.shape}')
+        return self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+    
+    def summarize(self, text, max_length=250, min_length=50, num_beams=4, encoded=None):
         """
         Summarize the input text
         
+        Inputs longer than the model window are split into window-sized chunks
+        that are summarized in one batched call and joined in order.
+        
         Args:
             text: Input transcript text
             max_length: Maximum length of summary tokens (increased from 150)
             min_length: Minimum length of summary tokens (increased from 30)
             num_beams: Number of beams for beam search
+            encoded: Optional EncodedTranscript from validation (skips re-tokenizing)
             
         Returns:
             Summary text
@@ -79,32 +229,15 @@ class SummarizationModel:
         try:
             logger.info(f'Starting summarization for text of length {len(text)} chars')
             
-            # Prepare input with summarize task prefix
-            input_text = f'summarize: {text}'
-            logger.info(f'Input prompt created: {input_text[:100]}...')
-            
-            inputs = self.tokenizer.encode(input_text, return_tensors='pt', max_length=512, truncation=True)
-            logger.info(f'Input tokens shape: {inputs.shape}')
-            
-            inputs = inputs.to(self.device)
+            if encoded is None:
+                encoded = self.encode(text)
+            windows = encoded.windows(self.max_input_tokens)
+            if len(windows) > 1:
+                logger.info(f'Input has {encoded.token_count} tokens, summarizing {len(windows)} chunks')
             
             # Generate summary
             logger.info(f'Generating summary with max_length={max_length}, min_length={min_length}, num_beams={num_beams}')
-            with torch.no_grad():
-                summary_ids = self.model.generate(
-                    inputs,
-                    max_length=max_length,
-                    min_length=min_length,
-                    num_beams=num_beams,
-                    early_stopping=True,
-                    length_penalty=2.0,
-                    no_repeat_ngram_size=3
-                )
-            
-            logger.info(f'Summary tokens generated: {summary_ids.shape}')
-            
-            # Decode summary
-            summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+            summary = ' '.join(self._summarize_windows(windows, max_length, min_length, num_beams))
             logger.info(f'Summary generated ({len(summary.split())} words): {summary[:100]}...')
             
             return summary
@@ -112,8 +245,40 @@ class SummarizationModel:
         except Exception as e:
             logger.error(f'Error during summarization: {str(e)}')
             raise
+    
+    def summarize_batch(self, texts, max_length=250, min_length=50, num_beams=4, encoded=None):
+        """
+        Summarize several transcripts with a single generate call
+        
+        Callers should pass transcripts of similar length to limit padding.
+        Over-window transcripts contribute one input per chunk.
+        
+        Args:
+            texts: List of transcript texts
+            max_length: Maximum length of summary tokens
+            min_length: Minimum length of summary tokens
+            num_beams: Number of beams for beam search
+            encoded: Optional EncodedTranscripts from validation, aligned with texts
+            
+        Returns:
+            List of summaries, in input order
+        """
+        try:
+            logger.info(f'Starting batch summarization of {len(texts)} transcripts')
+            
+            if encoded is None:
+                encoded = self.encode_batch(texts)
+            per_item = [item.windows(self.max_input_tokens) for item in encoded]
+            flat = [ids for windows in per_item for ids in windows]
+            
+            chunk_summaries = iter(self._summarize_windows(flat, max_length, min_length, num_beams))
+            return [' '.join(next(chunk_summaries) for _ in windows) for windows in per_item]
+            
+        except Exception as e:
+            logger.error(f'Error during batch summarization: {str(e)}')
+            raise
 
 
-def load_model(model_name='t5-base', use_finetuned=False):
-    """Helper function to load the model"""
-    return SummarizationModel(model_name=model_name, use_finetuned=use_finetuned)
+def load_model(model_name='t5-base', use_finetuned=False, **kwargs):
+    """Helper function to load the model (kwargs are passed to SummarizationModel)"""
+    return SummarizationModel(model_name=model_name, use_finetuned=use_finetuned, **kwargs)
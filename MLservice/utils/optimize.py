@@ -0,0 +1,201 @@
+"""
+Optional CPU/GPU execution optimizations: thread tuning, static-shape
+input bucketing and torch.compile of the encoder and decoder step
+"""
+
+import logging
+import time
+import types
+
+import torch
+import torch._dynamo
+
+logger = logging.getLogger(__name__)
+
+# Compilation problems that surface while serving; the model falls back to eager on these.
+# Looked up by name since FailOnRecompileLimitHit only exists in newer torch releases.
+COMPILE_ERRORS = tuple(getattr(torch._dynamo.exc, name)
+                       for name in ('TorchDynamoException', 'FailOnRecompileLimitHit')
+                       if hasattr(torch._dynamo.exc, name))
+
+_compile_configured = False
+
+
+def parse_buckets(spec):
+    """
+    Parse a comma-separated bucket list such as ``128,256,512``
+
+    Returns:
+        Sorted tuple of bucket lengths (empty tuple disables bucketing)
+    """
+    return tuple(sorted({int(b) for b in (spec or '').split(',') if b.strip()}))
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    Set PyTorch intra-op and inter-op thread pools
+
+    Inter-op threads can only be set before any parallel work has run, so this
+    should be called at startup before the model is loaded.
+    """
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            logger.warning(f'Could not set inter-op threads (already initialized): {e}')
+    logger.info(f'Torch threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}')
+
+
+def bucket_length(length, buckets):
+    """Smallest bucket that fits ``length`` (inputs are truncated to the largest)"""
+    for bucket in buckets:
+        if length <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def pad_to_bucket(input_ids, attention_mask, buckets, pad_token_id):
+    """
+    Right-pad a batch so the encoder only ever sees a few static shapes
+
+    Args:
+        input_ids: LongTensor [batch, seq]
+        attention_mask: LongTensor [batch, seq]
+        buckets: Sorted bucket lengths
+        pad_token_id: Tokenizer pad id
+
+    Returns:
+        (input_ids, attention_mask) padded to the bucket length
+    """
+    length = input_ids.shape[1]
+    target = bucket_length(length, buckets)
+    if target <= length:
+        return input_ids, attention_mask
+    pad = target - length
+    input_ids = torch.nn.functional.pad(input_ids, (0, pad), value=pad_token_id)
+    attention_mask = torch.nn.functional.pad(attention_mask, (0, pad), value=0)
+    return input_ids, attention_mask
+
+
+def configure_compile(recompile_limit=16):
+    """
+    Set the process-wide dynamo limits once, before any model is compiled
+
+    Hitting the recompile limit raises instead of silently running eager, so
+    models can fall back explicitly. Older torch releases name the limit
+    ``cache_size_limit`` and cannot raise on it; they only get the limit.
+
+    Args:
+        recompile_limit: Graphs allowed per compiled function
+    """
+    global _compile_configured
+    config = torch._dynamo.config
+    name = 'recompile_limit' if hasattr(config, 'recompile_limit') else 'cache_size_limit'
+    setattr(config, name, max(getattr(config, name), recompile_limit))
+    if hasattr(config, 'fail_on_recompile_limit_hit'):
+        config.fail_on_recompile_limit_hit = True
+    else:
+        logger.warning('This torch release cannot fail on the recompile limit; '
+                       'models over it run eager without reporting a fallback')
+    _compile_configured = True
+
+
+def _mark_batch_dynamic(kwargs):
+    # Size-1 dims are always specialized, so batch 1 and batch >= 2 get one graph each
+    if not hasattr(torch._dynamo, 'maybe_mark_dynamic'):
+        return
+    for name in ('input_ids', 'attention_mask', 'inputs_embeds'):
+        tensor = kwargs.get(name)
+        if tensor is not None and tensor.shape[0] > 1:
+            torch._dynamo.maybe_mark_dynamic(tensor, 0)
+
+
+def _encoder_forward(forward, *args, **kwargs):
+    return forward(*args, **kwargs)
+
+
+def _decoder_forward(forward, *args, **kwargs):
+    return forward(*args, **kwargs)
+
+
+def _own_frame(function):
+    """
+    Copy of ``function`` with its own code object
+
+    Dynamo keeps graphs and the recompile budget per code object. Encoder and
+    decoder are both T5Stack, and every registry model would otherwise share
+    them too, so each compiled forward gets its own copy.
+    """
+    return types.FunctionType(function.__code__.replace(), function.__globals__, function.__name__)
+
+
+def compile_model(model, mode=None):
+    """
+    Wrap encoder and decoder forwards with torch.compile
+
+    The encoder is compiled with static sequence lengths (inputs are bucketed)
+    and a dynamic batch dimension, the decoder dynamically since its cache
+    grows by one token every step. Dynamo limits are process-wide and set by
+    ``configure_compile`` (with defaults if it has not been called).
+
+    Args:
+        model: T5ForConditionalGeneration
+        mode: torch.compile mode (e.g. 'reduce-overhead', 'max-autotune')
+
+    Returns:
+        Callable that switches this model (only) back to the eager forwards
+    """
+    if not _compile_configured:
+        configure_compile()
+    encoder, decoder = model.get_encoder(), model.get_decoder()
+    eager_forwards = (encoder.forward, decoder.forward)
+
+    compiled = {
+        'encoder': torch.compile(_own_frame(_encoder_forward), mode=mode, dynamic=False),
+        'decoder': torch.compile(_own_frame(_decoder_forward), mode=mode, dynamic=True),
+    }
+
+    def encoder_forward(*args, **kwargs):
+        if not compiled:
+            return eager_forwards[0](*args, **kwargs)
+        _mark_batch_dynamic(kwargs)
+        return compiled['encoder'](eager_forwards[0], *args, **kwargs)
+
+    def decoder_forward(*args, **kwargs):
+        if not compiled:
+            return eager_forwards[1](*args, **kwargs)
+        return compiled['decoder'](eager_forwards[1], *args, **kwargs)
+
+    encoder.forward, decoder.forward = encoder_forward, decoder_forward
+
+    def restore():
+        # The installed forwards stay and switch to eager, so wrappers added on top
+        # of them later (e.g. profiler labels) survive. No torch._dynamo.reset():
+        # that would drop every other model's graphs too.
+        compiled.clear()
+
+    return restore
+
+
+def warmup(run, buckets, batch_sizes=(1, 2)):
+    """
+    Trigger compilation for every bucket and batch size and time it
+
+    Args:
+        run: Callable(seq_len, batch_size) that runs one short generation
+        buckets: Bucket lengths to warm up
+        batch_sizes: Batch sizes to warm up (1 and 2 cover the static and dynamic batch graphs)
+
+    Returns:
+        Dict of per-bucket warmup seconds
+    """
+    timings = {}
+    for bucket in buckets:
+        start = time.perf_counter()
+        for batch_size in batch_sizes:
+            run(bucket, batch_size)
+        timings[bucket] = round(time.perf_counter() - start, 3)
+        logger.info(f'Warmed up bucket {bucket} in {timings[bucket]:.2f}s')
+    return timings
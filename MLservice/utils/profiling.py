@@ -0,0 +1,248 @@
+"""
+Opt-in per-request profiling: torch profiler operator tables, Python stack
+samples (folded format for flame graphs) and phase timings, stored on disk
+with bounded retention
+"""
+
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from torch.profiler import ProfilerActivity, profile, record_function
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS = ('meta.json', 'operators.txt', 'trace.json', 'stacks.folded')
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        """Collapsed stacks, one ``frame;frame;frame count`` per line"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class ProfileSession:
+    """Per-request handle used to time named phases"""
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        with record_function(name):
+            yield
+        self.phases[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+class ProfileStore:
+    """
+    Keeps the most recent profiles in ``directory``, one subdirectory each,
+    bounded by count and by total size on disk
+    """
+
+    def __init__(self, directory, max_profiles=50, max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def save(self, meta, operators, trace_path, folded):
+        """Persist a profile and drop the oldest beyond ``max_profiles`` or ``max_bytes``"""
+        path = os.path.join(self.directory, meta['id'])
+        os.makedirs(path, exist_ok=True)
+        if trace_path is not None:
+            shutil.move(trace_path, os.path.join(path, 'trace.json'))
+        with open(os.path.join(path, 'operators.txt'), 'w') as f:
+            f.write(operators)
+        with open(os.path.join(path, 'stacks.folded'), 'w') as f:
+            f.write(folded)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        with self._lock:
+            total = 0
+            for index, meta in enumerate(self.list()):
+                path = os.path.join(self.directory, meta['id'])
+                total += _dir_size(path)
+                if index >= self.max_profiles or (self.max_bytes and total > self.max_bytes):
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def list(self):
+        """Profile metadata, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            try:
+                with open(os.path.join(self.directory, name, 'meta.json')) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda meta: meta['started'], reverse=True)
+
+    def get(self, profile_id):
+        for meta in self.list():
+            if meta['id'] == profile_id:
+                return meta
+        return None
+
+    def artifact_dir(self, profile_id):
+        return os.path.join(os.path.abspath(self.directory), profile_id)
+
+
+def _dir_size(path):
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    except OSError:
+        return 0
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and records them
+
+    A request is profiled when forced (e.g. ``X-Profile: 1``) or sampled with
+    probability ``sample_rate``. Sampled profiles are only kept when the request
+    took at least ``slow_ms``; forced ones are always kept. The torch profiler
+    is process-wide, so only one request is profiled at a time.
+
+    Artifacts are exported on a background thread so the profiled request
+    does not wait for them; the next profile starts once the export is done.
+    The full Chrome trace is large and slow to write, so it is only exported
+    with ``chrome_trace=True``.
+    """
+
+    def __init__(self, store, sample_rate=0.0, slow_ms=1000, stack_interval_ms=5, chrome_trace=False):
+        self.store = store
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.stack_interval = stack_interval_ms / 1000
+        self.chrome_trace = chrome_trace
+        self._active = threading.Lock()
+
+    def should_profile(self, forced=False):
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, forced=False, **meta):
+        """
+        Profile the enclosed block if selected
+
+        Yields:
+            ProfileSession (phase timings work whether or not profiling is on)
+        """
+        session = ProfileSession()
+        if not self.should_profile(forced) or not self._active.acquire(blocking=False):
+            yield session
+            return
+
+        exporting = False
+        try:
+            sampler = StackSampler(threading.get_ident(), self.stack_interval).start()
+            started = time.time()
+            start = time.perf_counter()
+            with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+                try:
+                    yield session
+                finally:
+                    sampler.stop()
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+
+            if forced or duration_ms >= self.slow_ms:
+                threading.Thread(
+                    target=self._export,
+                    args=(prof, sampler, session, started, duration_ms, forced, meta),
+                    name='profile-export', daemon=True,
+                ).start()
+                exporting = True
+        finally:
+            if not exporting:
+                self._active.release()
+
+    def _export(self, *args):
+        try:
+            self._save(*args)
+        finally:
+            self._active.release()
+
+    def _save(self, prof, sampler, session, started, duration_ms, forced, meta):
+        profile_id = f'{time.strftime("%Y%m%d-%H%M%S", time.localtime(started))}-{uuid.uuid4().hex[:8]}'
+        trace_path = None
+        if self.chrome_trace:
+            trace_path = os.path.join(self.store.directory, f'.{profile_id}.trace.json')
+        try:
+            os.makedirs(self.store.directory, exist_ok=True)
+            if trace_path is not None:
+                prof.export_chrome_trace(trace_path)
+            operators = prof.key_averages().table(sort_by='self_cpu_time_total', row_limit=50)
+            self.store.save({
+                'id': profile_id,
+                'started': started,
+                'duration_ms': duration_ms,
+                'forced': forced,
+                'phases_ms': session.phases,
+                'stack_samples': sum(sampler.samples.values()),
+                'artifacts': [name for name in ARTIFACTS if trace_path is not None or name != 'trace.json'],
+                **meta,
+            }, operators, trace_path, sampler.folded())
+            logger.info(f'Saved profile {profile_id} ({duration_ms:.0f} ms)')
+        except Exception as e:
+            logger.error(f'Failed to save profile: {str(e)}')
+            if trace_path is not None and os.path.exists(trace_path):
+                os.remove(trace_path)
+
+
+def instrument_model(model):
+    """
+    Label encoder and decoder-step calls in the torch profiler so beam search
+    bookkeeping shows up as the remaining ``generate`` time
+    """
+    for label, module in (('encoder', model.get_encoder()), ('decoder_step', model.get_decoder())):
+        forward = module.forward
+
+        def labelled(*args, _forward=forward, _label=label, **kwargs):
+            with record_function(_label):
+                return _forward(*args, **kwargs)
+
+        module.forward = labelled
+    return model
@@ -0,0 +1,253 @@
+"""
+Model registry with lazy loading, idle eviction and hot-swappable default
+"""
+
+import gc
+import glob
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import torch
+
+from utils.model import load_model
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownModelError(KeyError):
+    """Raised when a model name is not registered"""
+
+
+class ModelEntry:
+    """A registered checkpoint and its (possibly unloaded) model instance"""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.model = None
+        self.size_bytes = 0
+        self.expected_bytes = _checkpoint_size_bytes(path)
+        self.in_flight = 0
+        self.last_used = 0.0
+        self.load_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'loaded': self.loaded,
+            'size_mb': round(self.size_bytes / (1024 * 1024), 1),
+            'in_flight': self.in_flight,
+            'optimization': self.model.optimization if self.loaded else None,
+        }
+
+
+def _checkpoint_size_bytes(path):
+    """Size of the weight files of a local checkpoint (0 if unknown, e.g. a hub name)"""
+    if not os.path.isdir(path):
+        return 0
+    files = glob.glob(os.path.join(path, '*.safetensors')) or glob.glob(os.path.join(path, '*.bin'))
+    return sum(os.path.getsize(f) for f in files)
+
+
+def _model_size_bytes(model):
+    """
+    Approximate resident size of a SummarizationModel: parameters, buffers
+    and, with the static decoder, the most its KV cache pool keeps idle
+    """
+    module = model.model
+    tensors = list(module.parameters()) + list(module.buffers())
+    size = sum(t.numel() * t.element_size() for t in tensors)
+    decoder = getattr(model, 'decoder', None)
+    if decoder is not None:
+        size += decoder.pool.max_idle_bytes
+    return size
+
+
+class ModelRegistry:
+    """
+    Holds several checkpoints, loads them on first use and evicts idle ones
+    when the total loaded size exceeds the memory budget.
+
+    Requests borrow a model with ``acquire``; the borrowed instance stays alive
+    until the request finishes, so swapping the default never interrupts
+    in-flight work.
+    """
+
+    def __init__(self, memory_budget_bytes=0, loader=None):
+        """
+        Args:
+            memory_budget_bytes: Max total size of loaded models (0 = unlimited)
+            loader: Callable(path) -> model, defaults to the fine-tuned loader;
+                must raise if the checkpoint cannot be loaded
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loader = loader or (lambda path: load_model(model_name=path, use_finetuned=True, fallback_model=None))
+        self._entries = {}
+        self._default = None
+        self._lock = threading.Lock()
+
+    def register(self, name, path, make_default=False):
+        """Register a checkpoint under ``name`` without loading it"""
+        with self._lock:
+            existing = self._entries.get(name)
+            if existing is not None and existing.path != path and existing.loaded:
+                raise ValueError(f'Model {name} is loaded from {existing.path}; cannot change its path')
+            if existing is None or existing.path != path:
+                self._entries[name] = ModelEntry(name, path)
+            if make_default or self._default is None:
+                self._default = name
+        logger.info(f'Registered model {name} -> {path}')
+
+    @property
+    def default_name(self):
+        return self._default
+
+    def names(self):
+        with self._lock:
+            return list(self._entries)
+
+    def describe(self):
+        """Snapshot of registry state for health/admin endpoints"""
+        with self._lock:
+            return {
+                'default': self._default,
+                'memory_budget_mb': round(self.memory_budget_bytes / (1024 * 1024), 1),
+                'models': [entry.describe() for entry in self._entries.values()],
+            }
+
+    def _entry(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise UnknownModelError(name) from None
+
+    def _ensure_loaded(self, entry):
+        """Load ``entry`` if needed; concurrent callers wait on the same load"""
+        if entry.loaded:
+            return
+        with entry.load_lock:
+            if entry.loaded:
+                return
+            # Make room first so the new model never pushes peak memory over budget
+            self._enforce_budget(keep=entry.name, incoming_bytes=entry.expected_bytes)
+            logger.info(f'Lazily loading model {entry.name} from {entry.path}')
+            start = time.perf_counter()
+            model = self._loader(entry.path)
+            size = _model_size_bytes(model)
+            with self._lock:
+                entry.model = model
+                entry.size_bytes = size
+                entry.expected_bytes = size
+                entry.last_used = time.monotonic()
+            logger.info(f'Loaded model {entry.name} ({size / (1024 * 1024):.0f} MB) '
+                        f'in {time.perf_counter() - start:.1f}s')
+        self._enforce_budget(keep=entry.name)
+
+    def _enforce_budget(self, keep=None, incoming_bytes=0):
+        """
+        Evict least recently used idle models until under the memory budget
+
+        Args:
+            keep: Model name that must not be evicted
+            incoming_bytes: Size of a model about to be loaded, reserved up front
+        """
+        if not self.memory_budget_bytes:
+            return
+        evicted = []
+        with self._lock:
+            loaded = [e for e in self._entries.values() if e.loaded]
+            total = sum(e.size_bytes for e in loaded) + incoming_bytes
+            candidates = sorted(
+                (e for e in loaded if e.in_flight == 0 and e.name not in (keep, self._default)),
+                key=lambda e: e.last_used,
+            )
+            for entry in candidates:
+                if total <= self.memory_budget_bytes:
+                    break
+                total -= entry.size_bytes
+                entry.model = None
+                entry.size_bytes = 0
+                evicted.append(entry.name)
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            logger.info(f'Evicted idle models to fit memory budget: {", ".join(evicted)}')
+        elif total > self.memory_budget_bytes:
+            logger.warning('Loaded models exceed memory budget but none are idle for eviction')
+
+    @contextmanager
+    def acquire(self, name=None):
+        """
+        Borrow a model for the duration of a request
+
+        Args:
+            name: Registered model name (default model if None)
+
+        Yields:
+            (name, SummarizationModel)
+        """
+        with self._lock:
+            entry = self._entry(name or self._default)
+            entry.in_flight += 1
+        try:
+            self._ensure_loaded(entry)
+            model = entry.model
+            yield entry.name, model
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+                entry.last_used = time.monotonic()
+                released_idle = entry.in_flight == 0 and entry.name != self._default
+            if released_idle:
+                # A swapped-out model may only become evictable once its last request ends
+                self._enforce_budget()
+
+    def preload(self, name=None):
+        """Load a model ahead of traffic"""
+        with self.acquire(name):
+            pass
+
+    def set_default(self, name):
+        """
+        Atomically switch the default model
+
+        The new model is loaded before the switch, so requests never see an
+        unloaded default; requests already holding the old model finish on it.
+        """
+        with self.acquire(name):
+            with self._lock:
+                previous, self._default = self._default, name
+        logger.info(f'Default model switched: {previous} -> {name}')
+        self._enforce_budget(keep=name)
+        return previous
+
+
+def parse_registry_spec(spec):
+    """
+    Parse ``name=path,name2=path2`` into an ordered list of (name, path)
+
+    Args:
+        spec: Comma-separated registry spec (e.g. from MODEL_REGISTRY)
+
+    Returns:
+        List of (name, path) tuples
+    """
+    models = []
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, path = item.partition('=')
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f'Invalid model registry entry: {item!r} (expected name=path)')
+        models.append((name.strip(), path.strip()))
+    return models
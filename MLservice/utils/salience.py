@@ -0,0 +1,199 @@
+"""
+Extractive pre-selection for transcripts longer than the model window
+
+Every speaker turn is scored with a TF-IDF degree-centrality model built as a
+sparse matrix over the token ids already produced for validation, and the
+most salient turns are kept, in original order, up to the token budget.
+Tokens are mapped to turns through their character offsets, so selection
+never re-tokenizes the transcript. Turns longer than a fraction of the budget
+are split first, so a monologue still yields something to select.
+"""
+
+import re
+
+import numpy as np
+from scipy import sparse
+
+from utils.validation import EncodedTranscript
+
+_SPEAKER_TURN = re.compile(r'\b[A-Z][\w.\'-]{0,30}(?: [A-Z][\w.\'-]{0,30})?:\s')
+_SENTENCE_END = re.compile(r'[.!?]\s+')
+
+
+def _line_starts(text):
+    codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    return np.flatnonzero(codepoints == ord('\n')) + 1
+
+
+def _speaker_starts(text):
+    return np.fromiter((m.start() for m in _SPEAKER_TURN.finditer(text)), dtype=np.int64)
+
+
+def _sentence_starts(text):
+    return np.fromiter((m.end() for m in _SENTENCE_END.finditer(text)), dtype=np.int64)
+
+
+def assign_turns(text, offsets):
+    """
+    Map each token to a speaker turn
+
+    Uses line breaks, then ``Speaker:`` markers, then sentences, whichever
+    first yields more than one turn containing tokens.
+
+    Args:
+        text: Transcript text
+        offsets: Start character of each token in ``text``
+
+    Returns:
+        (int array of turn index per token, number of turns)
+    """
+    for boundaries in (_line_starts, _speaker_starts, _sentence_starts):
+        starts = np.concatenate(([0], boundaries(text))).astype(np.int64)
+        token_turn = np.searchsorted(starts, offsets, side='right') - 1
+        if len(token_turn) and token_turn[0] != token_turn[-1]:
+            return token_turn, len(starts)
+    return np.zeros(len(offsets), dtype=np.int64), 1
+
+
+def split_long_turns(token_turn, max_tokens):
+    """
+    Split turns longer than ``max_tokens`` into consecutive pieces
+
+    Args:
+        token_turn: Turn index of each token (non-decreasing)
+        max_tokens: Max tokens per piece
+
+    Returns:
+        (int array of piece index per token, number of pieces); empty turns
+        are dropped
+    """
+    if not len(token_turn):
+        return token_turn, 0
+    position = np.arange(len(token_turn))
+    turn_start = np.searchsorted(token_turn, token_turn, side='left')
+    piece = (position - turn_start) // max_tokens
+    boundary = (np.diff(token_turn) != 0) | (np.diff(piece) != 0)
+    token_piece = np.concatenate(([0], np.cumsum(boundary)))
+    return token_piece, int(token_piece[-1]) + 1
+
+
+def score_turns(token_turn, token_ids, n_turns, vocab_size):
+    """
+    Salience of each turn: TF-IDF cosine centrality weighted by lexical content
+
+    Centrality is the sum of a turn's cosine similarity to all turns,
+    computed as X @ (X^T 1) so the n x n similarity matrix is never built.
+
+    Args:
+        token_turn: Turn index of each token
+        token_ids: Token id of each token
+        n_turns: Number of turns
+        vocab_size: Tokenizer vocabulary size
+
+    Returns:
+        float array of scores, one per turn
+    """
+    tf = sparse.csr_matrix((np.ones(len(token_ids), dtype=np.float32), (token_turn, token_ids)),
+                           shape=(n_turns, vocab_size))
+    tf.sum_duplicates()
+
+    df = np.bincount(tf.indices, minlength=vocab_size)
+    idf = (np.log((1 + n_turns) / (1 + df)) + 1).astype(np.float32)
+
+    tfidf = tf.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    unit = sparse.diags(1 / norms) @ tfidf
+
+    centrality = np.asarray(unit @ unit.sum(axis=0).T).ravel() - 1  # drop self-similarity
+    # Backchannels ("yeah", "okay") are central but carry no content
+    distinct_terms = np.diff(tf.indptr)
+    return np.maximum(centrality, 0) / max(n_turns - 1, 1) * np.log1p(distinct_terms)
+
+
+def select_turns(scores, lengths, budget):
+    """
+    Highest scoring turns that fit the budget
+
+    Turns are taken greedily in score order; a turn that does not fit is
+    skipped and shorter, lower scoring turns can still fill the remainder.
+
+    Args:
+        scores: Salience per turn
+        lengths: Token count per turn
+        budget: Max total tokens
+
+    Returns:
+        Boolean mask of selected turns
+    """
+    order = np.argsort(-scores, kind='stable')
+    order = order[lengths[order] > 0]
+    # The prefix of the ranking that fits is taken at once; only the rest is
+    # filled turn by turn
+    taken = np.count_nonzero(np.cumsum(lengths[order]) <= budget)
+    selected = np.zeros(len(scores), dtype=bool)
+    selected[order[:taken]] = True
+
+    remaining = budget - int(lengths[order[:taken]].sum())
+    rest = order[taken:]
+    rest = rest[lengths[rest] <= remaining]
+    shortest = lengths[rest].min() if len(rest) else 0
+    for turn in rest:
+        if remaining < shortest:
+            break
+        if lengths[turn] <= remaining:
+            selected[turn] = True
+            remaining -= int(lengths[turn])
+    return selected
+
+
+class SalienceSelector:
+    """Builds a window-sized EncodedTranscript from the most salient turns"""
+
+    def __init__(self, tokenizer, prefix_ids, window, max_turn_fraction=0.25):
+        """
+        Args:
+            tokenizer: Fast tokenizer used by the model
+            prefix_ids: Token ids of the task prefix
+            window: Model input window (tokens, including prefix and EOS)
+            max_turn_fraction: Turns longer than this share of the budget are
+                split into pieces before scoring
+        """
+        self.prefix_ids = list(prefix_ids)
+        self.eos_token_id = tokenizer.eos_token_id
+        self.budget = window - len(self.prefix_ids) - 1
+        self.max_turn_tokens = max(1, int(self.budget * max_turn_fraction))
+        self.vocab_size = len(tokenizer)
+
+    def select(self, text, encoded):
+        """
+        Args:
+            text: Full transcript
+            encoded: Its EncodedTranscript (with token offsets)
+
+        Returns:
+            (EncodedTranscript, info dict) or (None, info) if the transcript
+            has no tokens to select from
+        """
+        if encoded.offsets is None:
+            return None, {'total_turns': 0}
+        body = slice(encoded.prefix_len, encoded.token_count - 1)
+        token_ids = np.asarray(encoded.input_ids[body], dtype=np.int64)
+        token_turn, n_turns = assign_turns(text, encoded.offsets[body])
+        total_turns = int(np.count_nonzero(np.bincount(token_turn, minlength=n_turns)))
+        token_turn, n_turns = split_long_turns(token_turn, self.max_turn_tokens)
+        if n_turns < 2:
+            return None, {'total_turns': total_turns}
+
+        lengths = np.bincount(token_turn, minlength=n_turns)
+        selected = select_turns(score_turns(token_turn, token_ids, n_turns, self.vocab_size),
+                                lengths, self.budget)
+
+        kept = token_ids[selected[token_turn]].tolist()
+        result = EncodedTranscript(self.prefix_ids + kept + [self.eos_token_id], len(self.prefix_ids))
+        return result, {
+            'total_turns': total_turns,
+            'selected_turns': int(np.count_nonzero(selected)),
+            'selected_tokens': result.token_count,
+            'dropped_tokens': encoded.token_count - result.token_count,
+        }
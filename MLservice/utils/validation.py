@@ -0,0 +1,167 @@
+"""
+Token-budget validation: counts tokens once with the fast tokenizer, caches
+the encoded ids for generation and plans chunking for over-window inputs
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+TASK_PREFIX = 'summarize: '
+
+
+class EncodedTranscript:
+    """
+    Token ids of ``summarize: <transcript>`` (including EOS), encoded once
+
+    ``offsets`` holds each token's start character in the transcript text
+    (without the prefix), used to map tokens back to speaker turns.
+    """
+
+    def __init__(self, input_ids, prefix_len, truncated_tokens=0, offsets=None):
+        self.input_ids = input_ids
+        self.prefix_len = prefix_len
+        self.truncated_tokens = truncated_tokens
+        self.offsets = offsets
+
+    @property
+    def token_count(self):
+        return len(self.input_ids)
+
+    def truncate(self, max_tokens):
+        """Copy limited to ``max_tokens`` (the EOS token is kept)"""
+        if self.token_count <= max_tokens:
+            return self
+        dropped = self.token_count - max_tokens
+        ids = self.input_ids[:max_tokens - 1] + self.input_ids[-1:]
+        return EncodedTranscript(ids, self.prefix_len, self.truncated_tokens + dropped)
+
+    def windows(self, window):
+        """
+        Split into model-sized inputs, each with the task prefix and EOS
+
+        Args:
+            window: Max tokens per model input (e.g. 512)
+
+        Returns:
+            List of token id lists (one element if the input already fits)
+        """
+        if self.token_count <= window:
+            return [self.input_ids]
+        prefix = self.input_ids[:self.prefix_len]
+        eos = self.input_ids[-1:]
+        body = self.input_ids[self.prefix_len:-1]
+        step = window - self.prefix_len - 1
+        return [prefix + body[i:i + step] + eos for i in range(0, len(body), step)]
+
+
+class TokenCounter:
+    """
+    Encodes transcripts with a (fast) tokenizer and caches the result, so
+    validation and generation share one tokenization per transcript
+
+    The cache is bounded by the total number of cached tokens, since one
+    long transcript can cost as much memory as thousands of short ones.
+    """
+
+    def __init__(self, tokenizer, max_cached_tokens=1_000_000):
+        self.tokenizer = tokenizer
+        self.max_cached_tokens = max_cached_tokens
+        self.cached_tokens = 0
+        self.prefix_ids = tokenizer(TASK_PREFIX.strip(), add_special_tokens=False)['input_ids']
+        self.prefix_len = len(self.prefix_ids)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, text):
+        """Return the EncodedTranscript for ``text`` (cached, never truncated)"""
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        with self._lock:
+            encoded = self._cache.get(key)
+            if encoded is not None:
+                self._cache.move_to_end(key)
+                return encoded
+
+        encoded = self._encode_many([text])[0]
+
+        with self._lock:
+            self._store(key, encoded)
+        return encoded
+
+    def encode_batch(self, texts):
+        """Encode many transcripts, tokenizing cache misses in one fast-tokenizer call"""
+        keys = [hashlib.sha1(text.encode('utf-8')).hexdigest() for text in texts]
+        with self._lock:
+            found = {key: self._cache[key] for key in keys if key in self._cache}
+        missing = [(key, text) for key, text in zip(keys, texts) if key not in found]
+        if missing:
+            encoded = self._encode_many([text for _, text in missing])
+            with self._lock:
+                for (key, _), item in zip(missing, encoded):
+                    found[key] = item
+                    self._store(key, item)
+        return [found[key] for key in keys]
+
+    def _store(self, key, encoded):
+        """Cache an entry and evict least recently used ones over the token budget (lock held)"""
+        if encoded.token_count > self.max_cached_tokens:
+            return
+        previous = self._cache.pop(key, None)
+        if previous is not None:
+            self.cached_tokens -= previous.token_count
+        self._cache[key] = encoded
+        self.cached_tokens += encoded.token_count
+        while self.cached_tokens > self.max_cached_tokens:
+            _, evicted = self._cache.popitem(last=False)
+            self.cached_tokens -= evicted.token_count
+
+    def _encode_many(self, texts):
+        batch = self.tokenizer([f'{TASK_PREFIX}{text}' for text in texts],
+                               truncation=False, return_offsets_mapping=True)
+        return [
+            EncodedTranscript(ids, self.prefix_len,
+                              offsets=np.array([start for start, _ in offsets], dtype=np.int64) - len(TASK_PREFIX))
+            for ids, offsets in zip(batch['input_ids'], batch['offset_mapping'])
+        ]
+
+
+def apply_token_budget(encoded, window, max_tokens, selector=None, text=None):
+    """
+    Fit an encoded transcript into the token budget
+
+    Inputs longer than the model window are reduced to their most salient
+    turns when a selector is given, otherwise routed to the chunked path
+    where only inputs beyond ``max_tokens`` are truncated. Tokens left out
+    either way are reported as truncated.
+
+    Args:
+        encoded: EncodedTranscript
+        window: Model input window (tokens)
+        max_tokens: Total tokens accepted across all chunks
+        selector: Optional SalienceSelector for extractive pre-selection
+        text: Transcript text (required with a selector)
+
+    Returns:
+        (EncodedTranscript to summarize, stats dict)
+    """
+    if selector is not None and encoded.token_count > window:
+        selected, info = selector.select(text, encoded)
+        if selected is not None:
+            return selected, {
+                'input_tokens': encoded.token_count,
+                'chunks': 1,
+                'truncated': info['dropped_tokens'] > 0,
+                'truncated_tokens': info['dropped_tokens'],
+                'extractive': info,
+            }
+
+    limited = encoded.truncate(max_tokens)
+    chunks = len(limited.windows(window))
+    return limited, {
+        'input_tokens': encoded.token_count,
+        'chunks': chunks,
+        'truncated': limited.truncated_tokens > 0,
+        'truncated_tokens': limited.truncated_tokens,
+    }
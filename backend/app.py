@@ -3,13 +3,16 @@ Flask backend API for Transcript2Minutes
 Handles incoming transcript requests and communicates with MLservice
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import requests
+import json
 import os
 from dotenv import load_dotenv
 import logging
 
+from batch import BatchRelay, parse_batch_body
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -17,7 +20,9 @@ CORS(app)
 
 # Configuration
 MLSERVICE_URL = os.getenv('MLSERVICE_URL', 'http://localhost:5001')
-MAX_TRANSCRIPT_LENGTH = 1500  # words (matches MLservice limit)
+MAX_TRANSCRIPT_CHARS = int(os.getenv('MAX_TRANSCRIPT_CHARS', '2000000'))  # coarse guard; MLservice enforces the token budget
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '1000'))
+BATCH_READ_TIMEOUT = int(os.getenv('BATCH_READ_TIMEOUT', '300'))  # seconds between streamed results
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -39,6 +44,16 @@ def health():
     })
 
 
+def _client_error(status_code, body):
+    """MLservice's message for a rejected request (4xx), e.g. an unknown model; None otherwise"""
+    if not 400 <= status_code < 500:
+        return None
+    try:
+        return json.loads(body).get('error')
+    except (ValueError, AttributeError):
+        return None
+
+
 @app.route('/summarize', methods=['POST'])
 def summarize():
     """
@@ -46,7 +61,8 @@ def summarize():
     
     Request JSON:
     {
-        "transcript": "meeting transcript text..."
+        "transcript": "meeting transcript text...",
+        "model": "optional registered model name"
     }
     
     Response JSON:
@@ -57,31 +73,41 @@ def summarize():
     try:
         data = request.get_json()
         
-        if not data or 'transcript' not in data:
+        if not isinstance(data, dict) or not isinstance(data.get('transcript'), str):
             return jsonify({'error': 'Missing transcript field'}), 400
         
+        model = data.get('model')
+        if model is not None and not isinstance(model, str):
+            return jsonify({'error': 'Invalid model field'}), 400
+        
         transcript = data['transcript'].strip()
         
         if not transcript:
             return jsonify({'error': 'Transcript cannot be empty'}), 400
         
-        # Check transcript length (rough word count)
-        word_count = len(transcript.split())
-        if word_count > MAX_TRANSCRIPT_LENGTH:
+        # Coarse size guard only; MLservice counts tokens once and chunks long inputs
+        if len(transcript) > MAX_TRANSCRIPT_CHARS:
             return jsonify({
-                'error': f'Transcript too long. Maximum {MAX_TRANSCRIPT_LENGTH} words allowed. Got {word_count} words.'
+                'error': f'Transcript too long. Maximum {MAX_TRANSCRIPT_CHARS} characters allowed. Got {len(transcript)}.'
             }), 400
         
         # Forward request to MLservice
-        logger.info(f'Sending transcript to MLservice ({word_count} words)')
+        payload = {'transcript': transcript}
+        if model:
+            payload['model'] = model
+        
+        logger.info(f'Sending transcript to MLservice ({len(transcript)} chars)')
         response = requests.post(
             f'{MLSERVICE_URL}/summarize',
-            json={'transcript': transcript},
+            json=payload,
             timeout=60
         )
         
         if response.status_code != 200:
             logger.error(f'MLservice error: {response.text}')
+            client_error = _client_error(response.status_code, response.content)
+            if client_error:
+                return jsonify({'error': client_error}), response.status_code
             return jsonify({'error': 'Failed to generate minutes. Please try again.'}), 500
         
         result = response.json()
@@ -100,6 +126,75 @@ def summarize():
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
 
+@app.route('/summarize/batch', methods=['POST'])
+def summarize_batch():
+    """
+    Summarize many transcripts over a single connection
+    
+    Request body: JSON array or NDJSON, one item per transcript
+    [
+        {"id": "meeting-1", "transcript": "..."},
+        "plain transcript text..."
+    ]
+    
+    Optional ?model=<registered name> selects the model for the whole batch.
+    
+    Response: NDJSON, one line per item as it completes (not in input order)
+    {"index": 0, "id": "meeting-1", "minutes": "...", "stats": {...}}
+    {"index": 1, "id": null, "error": "Transcript cannot be empty"}
+    {"done": true, "succeeded": 1, "failed": 1}
+    """
+    try:
+        items = parse_batch_body(request.get_data(), request.content_type or '')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'error': f'Too many transcripts. Maximum {MAX_BATCH_ITEMS}. Got {len(items)}.'}), 400
+    
+    model = request.args.get('model')
+    relay = BatchRelay(items, MAX_TRANSCRIPT_CHARS)
+    logger.info(f'Batch request: forwarding {len(relay.forwarded)} transcripts, rejected {len(relay.rejected)}')
+    
+    def generate():
+        yield from relay.rejected_lines()
+        
+        error = 'Failed to generate minutes. Please try again.'
+        if relay.forwarded:
+            try:
+                with requests.post(
+                    f'{MLSERVICE_URL}/summarize/batch',
+                    params={'model': model} if model else None,
+                    data=relay.upstream_body().encode('utf-8'),
+                    headers={'Content-Type': 'application/x-ndjson'},
+                    stream=True,
+                    timeout=(5, BATCH_READ_TIMEOUT)
+                ) as response:
+                    if response.status_code != 200:
+                        logger.error(f'MLservice error: {response.text}')
+                        error = _client_error(response.status_code, response.content) or error
+                    else:
+                        for line in response.iter_lines():
+                            result = relay.remap(line)
+                            if result:
+                                yield result
+            except requests.exceptions.ConnectionError:
+                logger.error('Cannot connect to MLservice')
+            except requests.exceptions.Timeout:
+                logger.error('MLservice request timeout')
+            except requests.exceptions.RequestException as e:
+                logger.error(f'MLservice batch stream failed: {str(e)}')
+            except Exception as e:
+                # Unexpected upstream output must not cut the stream short of per-item errors
+                logger.error(f'Failed to relay MLservice batch results: {str(e)}')
+            
+            yield from relay.unfinished(error)
+        
+        yield relay.done_line()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
@@ -0,0 +1,150 @@
+"""
+Batch request helpers shared by the Flask backend and the async gateway
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_batch_body(body, content_type=''):
+    """
+    Parse a batch body into independent items
+
+    Accepts a JSON array, ``{"transcripts": [...]}`` or NDJSON (one item per
+    line). Items are either transcript strings or ``{"id": ..., "transcript": ...}``.
+    A malformed NDJSON line only fails that item.
+
+    Deliberately duplicated in ``MLservice/utils/batch.py``: the backend and MLservice
+    are deployed separately and share no package, so keep both in sync.
+
+    Args:
+        body: Raw request body (str or bytes)
+        content_type: Request Content-Type header
+
+    Returns:
+        List of dicts with 'id', 'transcript' and optionally 'error'
+
+    Raises:
+        ValueError: If the body as a whole cannot be parsed
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+
+    if 'ndjson' not in content_type and 'jsonlines' not in content_type:
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get('transcripts'), list):
+            data = data['transcripts']
+        if isinstance(data, list):
+            return [_normalize_item(item) for item in data]
+
+    items = []
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(_normalize_item(json.loads(line)))
+        except json.JSONDecodeError:
+            items.append({'id': None, 'transcript': None, 'error': 'Invalid JSON line'})
+    if not items:
+        raise ValueError('Body must be a JSON array or NDJSON')
+    return items
+
+
+def _normalize_item(item):
+    if isinstance(item, str):
+        return {'id': None, 'transcript': item}
+    if isinstance(item, dict):
+        return {'id': item.get('id'), 'transcript': item.get('transcript')}
+    return {'id': None, 'transcript': None, 'error': 'Item must be a string or an object'}
+
+
+class BatchRelay:
+    """
+    Validates batch items and maps MLservice results back to client positions
+
+    Only valid transcripts are forwarded; MLservice indexes its results by
+    position in the forwarded list, which ``remap`` translates back.
+    """
+
+    def __init__(self, items, max_chars):
+        self.rejected = []
+        self.forwarded = []
+        self._pending = {}
+        for index, item in enumerate(items):
+            error = item.get('error') or self._validate(item['transcript'], max_chars)
+            if error:
+                self.rejected.append({'index': index, 'id': item['id'], 'error': error})
+            else:
+                self._pending[len(self.forwarded)] = (index, item['id'])
+                self.forwarded.append({'transcript': item['transcript'].strip()})
+        self.succeeded = 0
+        self.failed = len(self.rejected)
+
+    @staticmethod
+    def _validate(transcript, max_chars):
+        if not isinstance(transcript, str):
+            return 'Missing transcript field'
+        transcript = transcript.strip()
+        if not transcript:
+            return 'Transcript cannot be empty'
+        if len(transcript) > max_chars:
+            return f'Transcript too long. Maximum {max_chars} characters allowed. Got {len(transcript)}.'
+        return None
+
+    def upstream_body(self):
+        """NDJSON body to send to MLservice"""
+        return ''.join(json.dumps(item) + '\n' for item in self.forwarded)
+
+    def remap(self, line):
+        """
+        Translate one MLservice result line to client positions
+
+        A malformed or partial line is skipped; its item stays pending and is
+        reported by ``unfinished``.
+
+        Returns:
+            NDJSON line for the client, or None for lines that are not item results
+        """
+        if isinstance(line, (bytes, str)):
+            line = line.strip()
+            if not line:
+                return None
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f'Skipping malformed MLservice result line: {line[:200]!r}')
+                return None
+        else:
+            record = line
+        if not isinstance(record, dict) or 'index' not in record:
+            return None
+        position = self._pending.pop(record['index'], None)
+        if position is None:
+            return None
+        record['index'], record['id'] = position
+        if 'error' in record:
+            self.failed += 1
+        else:
+            self.succeeded += 1
+        return json.dumps(record) + '\n'
+
+    def unfinished(self, error):
+        """Error lines for forwarded items that never got a result"""
+        lines = []
+        for index, item_id in self._pending.values():
+            self.failed += 1
+            lines.append(json.dumps({'index': index, 'id': item_id, 'error': error}) + '\n')
+        self._pending.clear()
+        return lines
+
+    def rejected_lines(self):
+        return [json.dumps(result) + '\n' for result in self.rejected]
+
+    def done_line(self):
+        return json.dumps({'done': True, 'succeeded': self.succeeded, 'failed': self.failed}) + '\n'
@@ -0,0 +1,313 @@
+"""
+Async (ASGI) gateway for Transcript2Minutes
+Non-blocking alternative to app.py that proxies requests to one or more
+MLservice replicas with least-outstanding-requests load balancing
+
+Run with: uvicorn gateway:app --port 5002
+"""
+
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+
+import httpx
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from batch import BatchRelay, parse_batch_body
+from replicas import NoHealthyReplicaError, ReplicaPool
+
+load_dotenv()
+
+# Configuration
+MLSERVICE_URLS = [u.strip() for u in os.getenv('MLSERVICE_URLS', os.getenv('MLSERVICE_URL', 'http://localhost:5001')).split(',') if u.strip()]
+MAX_TRANSCRIPT_CHARS = int(os.getenv('MAX_TRANSCRIPT_CHARS', '2000000'))  # coarse guard; MLservice enforces the token budget
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '1000'))
+BATCH_READ_TIMEOUT = float(os.getenv('BATCH_READ_TIMEOUT', '300'))  # seconds between streamed results
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', '60'))
+MAX_UPSTREAM_CONNECTIONS = int(os.getenv('MAX_UPSTREAM_CONNECTIONS', '1000'))
+REPLICA_MAX_FAILURES = int(os.getenv('REPLICA_MAX_FAILURES', '3'))
+REPLICA_EJECT_SECONDS = float(os.getenv('REPLICA_EJECT_SECONDS', '30'))
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '5'))
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger('httpx').setLevel(logging.WARNING)  # per-request logs are too noisy at high concurrency
+
+pool = ReplicaPool(
+    MLSERVICE_URLS,
+    max_failures=REPLICA_MAX_FAILURES,
+    eject_seconds=REPLICA_EJECT_SECONDS,
+    health_interval=HEALTH_CHECK_INTERVAL,
+)
+client = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Share one pooled HTTP client across all requests"""
+    global client
+    client = httpx.AsyncClient(
+        timeout=UPSTREAM_TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_UPSTREAM_CONNECTIONS,
+                            max_keepalive_connections=MAX_UPSTREAM_CONNECTIONS),
+    )
+    pool.start_health_checks(client)
+    logger.info(f'Gateway proxying to MLservice replicas: {", ".join(MLSERVICE_URLS)}')
+    try:
+        yield
+    finally:
+        await pool.stop_health_checks()
+        await client.aclose()
+
+
+async def _send_upstream(method, path, body=None, headers=None, timeout=None):
+    """
+    Send a request to the least loaded replica, failing over on connect errors
+
+    Returns:
+        (replica, streaming httpx.Response)
+    """
+    tried = []
+    last_error = None
+    for _ in range(len(pool.replicas)):
+        try:
+            replica = pool.acquire(exclude=tried)
+        except NoHealthyReplicaError:
+            break
+        upstream = client.build_request(method, f'{replica.url}{path}', content=body, headers=headers,
+                                        timeout=timeout or UPSTREAM_TIMEOUT)
+        try:
+            return replica, await client.send(upstream, stream=True)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            # Nothing reached the replica, so it is safe to retry elsewhere
+            pool.release(replica, ok=False)
+            tried.append(replica)
+            last_error = e
+            logger.warning(f'Cannot connect to MLservice replica {replica.url}')
+        except Exception:
+            pool.release(replica, ok=False)
+            raise
+    raise last_error or NoHealthyReplicaError('No healthy MLservice replicas available')
+
+
+def _stream_response(replica, response):
+    """Relay an upstream body chunk by chunk, releasing the replica when done"""
+    async def body():
+        ok = False
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+            ok = True
+        finally:
+            await response.aclose()
+            pool.release(replica, ok=ok)
+
+    return StreamingResponse(
+        body(),
+        status_code=response.status_code,
+        media_type=response.headers.get('content-type', 'application/json'),
+    )
+
+
+async def _proxy(method, path, payload):
+    """Forward a JSON payload and stream the replica's answer back"""
+    try:
+        replica, response = await _send_upstream(
+            method, path,
+            body=json.dumps(payload),
+            headers={'Content-Type': 'application/json'},
+        )
+    except (httpx.ConnectError, httpx.ConnectTimeout, NoHealthyReplicaError):
+        logger.error('Cannot connect to MLservice')
+        return JSONResponse({'error': 'MLservice is not available. Please try again later.'}, status_code=503)
+    except httpx.TimeoutException:
+        logger.error('MLservice request timeout')
+        return JSONResponse({'error': 'Request timeout. Transcript may be too long.'}, status_code=504)
+
+    if response.status_code != 200:
+        try:
+            error_text = (await response.aread()).decode(errors='replace')
+        finally:
+            await response.aclose()
+            pool.release(replica, ok=response.status_code < 500)
+        logger.error(f'MLservice error from {replica.url}: {error_text}')
+        client_error = _client_error(response.status_code, error_text)
+        if client_error:
+            return JSONResponse({'error': client_error}, status_code=response.status_code)
+        return JSONResponse({'error': 'Failed to generate minutes. Please try again.'}, status_code=500)
+
+    return _stream_response(replica, response)
+
+
+def _client_error(status_code, body):
+    """MLservice's message for a rejected request (4xx), e.g. an unknown model; None otherwise"""
+    if not 400 <= status_code < 500:
+        return None
+    try:
+        return json.loads(body).get('error')
+    except (ValueError, AttributeError):
+        return None
+
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+async def health(request):
+    """Health check endpoint"""
+    replicas = pool.describe()
+    return JSONResponse({
+        'status': 'healthy',
+        'mlservice': 'healthy' if any(r['healthy'] for r in replicas) else 'unreachable',
+        'replicas': replicas,
+    })
+
+
+async def summarize(request):
+    """
+    Main endpoint to summarize meeting transcripts
+
+    Request JSON:
+    {
+        "transcript": "meeting transcript text...",
+        "model": "optional registered model name"
+    }
+
+    Response JSON:
+    {
+        "minutes": "formatted minutes as bullet points..."
+    }
+    """
+    data = await _read_json(request)
+
+    if not isinstance(data, dict) or not isinstance(data.get('transcript'), str):
+        return JSONResponse({'error': 'Missing transcript field'}, status_code=400)
+
+    model = data.get('model')
+    if model is not None and not isinstance(model, str):
+        return JSONResponse({'error': 'Invalid model field'}, status_code=400)
+
+    transcript = data['transcript'].strip()
+
+    if not transcript:
+        return JSONResponse({'error': 'Transcript cannot be empty'}, status_code=400)
+
+    # Coarse size guard only; MLservice counts tokens once and chunks long inputs
+    if len(transcript) > MAX_TRANSCRIPT_CHARS:
+        return JSONResponse({
+            'error': f'Transcript too long. Maximum {MAX_TRANSCRIPT_CHARS} characters allowed. Got {len(transcript)}.'
+        }, status_code=400)
+
+    payload = {'transcript': transcript}
+    if model:
+        payload['model'] = model
+
+    logger.info(f'Sending transcript to MLservice ({len(transcript)} chars)')
+    return await _proxy('POST', '/summarize', payload)
+
+
+async def summarize_batch(request):
+    """
+    Summarize many transcripts over a single connection
+
+    Request body: JSON array or NDJSON, one item per transcript
+    Optional ?model=<registered name> selects the model for the whole batch
+    Response: NDJSON, one line per item as it completes, then a "done" line
+    """
+    try:
+        items = parse_batch_body(await request.body(), request.headers.get('content-type', ''))
+    except (ValueError, UnicodeDecodeError) as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    if len(items) > MAX_BATCH_ITEMS:
+        return JSONResponse({'error': f'Too many transcripts. Maximum {MAX_BATCH_ITEMS}. Got {len(items)}.'},
+                            status_code=400)
+
+    model = request.query_params.get('model')
+    path = f'/summarize/batch?{urlencode({"model": model})}' if model else '/summarize/batch'
+    relay = BatchRelay(items, MAX_TRANSCRIPT_CHARS)
+    logger.info(f'Batch request: forwarding {len(relay.forwarded)} transcripts, rejected {len(relay.rejected)}')
+
+    async def body():
+        for line in relay.rejected_lines():
+            yield line
+
+        error = 'Failed to generate minutes. Please try again.'
+        if relay.forwarded:
+            replica = None
+            ok = False
+            try:
+                replica, response = await _send_upstream(
+                    'POST', path,
+                    body=relay.upstream_body().encode('utf-8'),
+                    headers={'Content-Type': 'application/x-ndjson'},
+                    timeout=httpx.Timeout(UPSTREAM_TIMEOUT, read=BATCH_READ_TIMEOUT),
+                )
+                try:
+                    if response.status_code == 200:
+                        async for line in response.aiter_lines():
+                            result = relay.remap(line)
+                            if result:
+                                yield result
+                        ok = True
+                    else:
+                        error_text = (await response.aread()).decode(errors='replace')
+                        logger.error(f'MLservice error from {replica.url}: {error_text}')
+                        error = _client_error(response.status_code, error_text) or error
+                        ok = response.status_code < 500
+                finally:
+                    await response.aclose()
+            except (httpx.HTTPError, NoHealthyReplicaError) as e:
+                logger.error(f'MLservice batch stream failed: {e!r}')
+            except Exception as e:
+                # Unexpected upstream output must not cut the stream short of per-item errors
+                logger.error(f'Failed to relay MLservice batch results: {e!r}')
+            finally:
+                if replica is not None:
+                    pool.release(replica, ok=ok)
+
+            for line in relay.unfinished(error):
+                yield line
+
+        yield relay.done_line()
+
+    return StreamingResponse(body(), media_type='application/x-ndjson')
+
+
+async def not_found(request, exc):
+    return JSONResponse({'error': 'Endpoint not found'}, status_code=404)
+
+
+async def internal_error(request, exc):
+    logger.error(f'Internal server error: {str(exc)}')
+    return JSONResponse({'error': 'Internal server error'}, status_code=500)
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health, methods=['GET']),
+        Route('/summarize', summarize, methods=['POST']),
+        Route('/summarize/batch', summarize_batch, methods=['POST']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    exception_handlers={404: not_found, 500: internal_error},
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info('Starting async gateway on http://localhost:5002')
+    uvicorn.run(app, host='0.0.0.0', port=5002, log_level='info')
@@ -0,0 +1,68 @@
+"""
+Concurrent load generator for the backend/gateway
+
+Example (gateway in front of two stub replicas):
+    STUB_LATENCY_MS=200 uvicorn stub_mlservice:app --port 5101 &
+    STUB_LATENCY_MS=200 uvicorn stub_mlservice:app --port 5102 &
+    MLSERVICE_URLS=http://localhost:5101,http://localhost:5102 uvicorn gateway:app --port 5002 &
+    python loadtest.py --url http://localhost:5002/summarize --concurrency 2000 --requests 20000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+SAMPLE_TRANSCRIPT = ("Person A: Let's discuss Q4 goals. "
+                     "Person B: Sure, we should focus on customer retention.")
+
+
+async def _worker(client, url, queue, latencies, errors):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, json={'transcript': SAMPLE_TRANSCRIPT})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+
+async def run(url, concurrency, total, timeout):
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    latencies, errors = [], {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(_worker(client, url, queue, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f'Requests: {total}  concurrency: {concurrency}  elapsed: {elapsed:.2f}s')
+    print(f'Throughput: {len(latencies) / elapsed:.1f} req/s  errors: {errors or 0}')
+    if latencies:
+        latencies.sort()
+        pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        print(f'Latency ms  mean: {statistics.mean(latencies) * 1000:.1f}  '
+              f'p50: {pct(0.50):.1f}  p95: {pct(0.95):.1f}  p99: {pct(0.99):.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the summarize endpoint')
+    parser.add_argument('--url', default='http://localhost:5002/summarize')
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.concurrency, args.requests, args.timeout))
@@ -0,0 +1,134 @@
+"""
+MLservice replica pool with least-outstanding-requests balancing
+and health-based ejection for the async gateway
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class NoHealthyReplicaError(Exception):
+    """Raised when every replica is ejected"""
+
+
+class Replica:
+    """A single MLservice instance and its live load/health counters"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.total_requests = 0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.ejected_until
+
+    def describe(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'failures': self.failures,
+            'total_requests': self.total_requests,
+        }
+
+
+class ReplicaPool:
+    """
+    Picks the healthy replica with the fewest in-flight requests.
+
+    A replica is ejected for ``eject_seconds`` after ``max_failures``
+    consecutive connection errors/5xx responses, and re-admitted early when
+    the background health check sees it answer ``/health`` again.
+    """
+
+    def __init__(self, urls, max_failures=3, eject_seconds=30.0, health_interval=5.0):
+        """
+        Args:
+            urls: MLservice base URLs
+            max_failures: Consecutive failures before a replica is ejected
+            eject_seconds: How long an ejected replica is skipped
+            health_interval: Seconds between background /health probes
+        """
+        if not urls:
+            raise ValueError('At least one MLservice URL is required')
+        self.replicas = [Replica(url) for url in urls]
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self._health_task = None
+
+    def pick(self, exclude=()):
+        """Return the least loaded healthy replica (random tie-break)"""
+        candidates = [r for r in self.replicas if r.healthy and r not in exclude]
+        if not candidates:
+            raise NoHealthyReplicaError('No healthy MLservice replicas available')
+        least = min(r.outstanding for r in candidates)
+        return random.choice([r for r in candidates if r.outstanding == least])
+
+    def acquire(self, exclude=()):
+        """Pick a replica and count the request against it"""
+        replica = self.pick(exclude)
+        replica.outstanding += 1
+        replica.total_requests += 1
+        return replica
+
+    def release(self, replica, ok):
+        """Finish a request and update the replica's health"""
+        replica.outstanding -= 1
+        if ok:
+            replica.failures = 0
+            return
+        replica.failures += 1
+        if replica.failures >= self.max_failures and replica.healthy:
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+            logger.warning(f'Ejecting MLservice replica {replica.url} for {self.eject_seconds:.0f}s '
+                           f'after {replica.failures} consecutive failures')
+
+    def describe(self):
+        return [replica.describe() for replica in self.replicas]
+
+    async def _probe(self, client, replica):
+        try:
+            response = await client.get(f'{replica.url}/health', timeout=5)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+
+        if ok and not replica.healthy:
+            logger.info(f'Re-admitting MLservice replica {replica.url}')
+            replica.ejected_until = 0.0
+            replica.failures = 0
+        elif not ok:
+            # Keep extending the ejection so a dead replica never gets live traffic
+            if replica.healthy:
+                logger.warning(f'Health check failed, ejecting MLservice replica {replica.url}')
+            replica.failures = max(replica.failures, self.max_failures)
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    async def _health_loop(self, client):
+        while True:
+            await asyncio.gather(*(self._probe(client, r) for r in self.replicas))
+            await asyncio.sleep(self.health_interval)
+
+    def start_health_checks(self, client):
+        """Start background health probing on the running event loop"""
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop(client))
+
+    async def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
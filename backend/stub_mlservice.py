@@ -0,0 +1,64 @@
+"""
+Stub MLservice for gateway load testing
+Answers /health, /summarize and /summarize/batch with a fixed latency instead of running the model
+
+Run with: STUB_LATENCY_MS=200 uvicorn stub_mlservice:app --port 5101
+"""
+
+import asyncio
+import json
+import os
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+STUB_LATENCY_MS = float(os.getenv('STUB_LATENCY_MS', '200'))
+
+
+async def health(request):
+    return JSONResponse({'status': 'healthy', 'model': 'stub', 'device': 'cpu'})
+
+
+async def summarize(request):
+    data = await request.json()
+    transcript = data.get('transcript', '')
+    await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    minutes = 'Stub summary of the meeting.'
+    return JSONResponse({
+        'minutes': minutes,
+        'stats': {
+            'input_words': len(transcript.split()),
+            'output_words': len(minutes.split())
+        }
+    })
+
+
+async def summarize_batch(request):
+    lines = [json.loads(line) for line in (await request.body()).decode().splitlines() if line.strip()]
+
+    async def body():
+        for index, item in enumerate(lines):
+            await asyncio.sleep(STUB_LATENCY_MS / 1000)
+            yield json.dumps({
+                'index': index,
+                'id': item.get('id'),
+                'minutes': 'Stub summary of the meeting.',
+                'stats': {'input_words': len(item.get('transcript', '').split()), 'output_words': 5}
+            }) + '\n'
+        yield json.dumps({'done': True, 'succeeded': len(lines), 'failed': 0}) + '\n'
+
+    return StreamingResponse(body(), media_type='application/x-ndjson')
+
+
+app = Starlette(routes=[
+    Route('/health', health, methods=['GET']),
+    Route('/summarize', summarize, methods=['POST']),
+    Route('/summarize/batch', summarize_batch, methods=['POST']),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', '5101')), log_level='warning')